@@ -23,27 +23,29 @@ def upgrade():
     # Add composite index on userlibrary (user_id, book_id) for faster lookups
     op.create_index('ix_userlibrary_user_book', 'userlibrary', ['user_id', 'book_id'], unique=False)
 
-    # Change added_date from string to timestamp
-    # First, add a new column with the correct type
-    op.add_column('userlibrary', sa.Column('added_date_new', sa.DateTime(), nullable=True))
-
-    # For existing rows, set added_date_new to current timestamp
-    # (since the old added_date values are UUIDs and can't be converted to dates)
-    op.execute("UPDATE userlibrary SET added_date_new = NOW()")
-
-    # Drop the old column
-    op.drop_column('userlibrary', 'added_date')
-
-    # Rename the new column to added_date
-    op.alter_column('userlibrary', 'added_date_new', new_column_name='added_date', nullable=False)
+    # Change added_date from string to timestamp in place (one table rewrite).
+    # Existing values are UUIDs and can't be converted to dates, so existing
+    # rows get the current timestamp.
+    op.alter_column(
+        'userlibrary',
+        'added_date',
+        type_=sa.DateTime(),
+        existing_type=sa.String(),
+        existing_nullable=False,
+        postgresql_using='NOW()::timestamp',
+    )
 
 
 def downgrade():
     # Revert added_date to string type
-    op.add_column('userlibrary', sa.Column('added_date_old', sa.String(), nullable=True))
-    op.execute("UPDATE userlibrary SET added_date_old = added_date::text")
-    op.drop_column('userlibrary', 'added_date')
-    op.alter_column('userlibrary', 'added_date_old', new_column_name='added_date', nullable=False)
+    op.alter_column(
+        'userlibrary',
+        'added_date',
+        type_=sa.String(),
+        existing_type=sa.DateTime(),
+        existing_nullable=False,
+        postgresql_using='added_date::text',
+    )
 
     # Drop composite index
     op.drop_index('ix_userlibrary_user_book', table_name='userlibrary')
@@ -0,0 +1,36 @@
+"""add unique constraint on userlibrary (user_id, book_id)
+
+Revision ID: c7e1f4a9d2b3
+Revises: b2c3d4e5f6g7
+Create Date: 2026-10-15 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1f4a9d2b3'
+down_revision = 'b2c3d4e5f6g7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove duplicate library entries, keeping the earliest one per (user, book)
+    op.execute("""
+        DELETE FROM userlibrary a
+        USING userlibrary b
+        WHERE a.user_id = b.user_id
+          AND a.book_id = b.book_id
+          AND (a.added_date, a.id) > (b.added_date, b.id)
+    """)
+
+    # The unique constraint's index replaces the plain composite index
+    op.drop_index('ix_userlibrary_user_book', table_name='userlibrary')
+    op.create_unique_constraint(
+        'uq_userlibrary_user_book', 'userlibrary', ['user_id', 'book_id']
+    )
+
+
+def downgrade():
+    op.drop_constraint('uq_userlibrary_user_book', 'userlibrary', type_='unique')
+    op.create_index('ix_userlibrary_user_book', 'userlibrary', ['user_id', 'book_id'], unique=False)
@@ -0,0 +1,30 @@
+"""add covering index on userlibrary user_id
+
+Revision ID: d4a8b2e6f1c9
+Revises: c7e1f4a9d2b3
+Create Date: 2026-10-15 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8b2e6f1c9'
+down_revision = 'c7e1f4a9d2b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Library listing filters on user_id and only needs book_id/added_date from
+    # userlibrary, so INCLUDE them to allow index-only scans on Postgres
+    op.create_index(
+        'ix_userlibrary_user_book_covering',
+        'userlibrary',
+        ['user_id'],
+        unique=False,
+        postgresql_include=['book_id', 'added_date'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_userlibrary_user_book_covering', table_name='userlibrary')
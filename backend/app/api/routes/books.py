@@ -7,9 +7,10 @@ from typing import Any
 from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from sqlmodel import Session, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, func, select
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import AsyncSessionDep, CurrentUser
 from app.models import (
     Book,
     BookPublic,
@@ -19,20 +20,32 @@ from app.models import (
     User,
     UserLibrary,
 )
-from app.services.google_books_service import GoogleBooksService
+from app.services.google_books_service import (
+    BATCH_QUERY_SIZE,
+    BookHit,
+    GoogleBooksService,
+)
 from app.services.recommendation_service import RecommendationService
 from app.services.vision_service import VisionService
 
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
+# Upload limits for /scan
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Cap concurrent Google Books lookups so large scans don't trigger 429s
+GOOGLE_BOOKS_CONCURRENCY = 8
+google_books_semaphore = asyncio.Semaphore(GOOGLE_BOOKS_CONCURRENCY)
+
 
 @router.post("/scan", response_model=ScanResult)
 @limiter.limit("10/minute")  # 10 scans per minute per IP
 async def scan_books(
     request: Request,
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: CurrentUser,
     file: UploadFile = File(...),
 ) -> ScanResult:
@@ -42,7 +55,7 @@ async def scan_books(
     This endpoint:
     1. Accepts an image upload
     2. Uses Vision Language Model to extract book titles and authors
-    3. Queries Google Books API for each detected title (parallel)
+    3. Queries Google Books API for the detected titles (batched, parallel)
     4. Compares against user's library
     5. Returns recommendations based on user's reading preferences
     """
@@ -51,51 +64,83 @@ async def scan_books(
         raise HTTPException(status_code=400, detail="File must be an image")
 
     try:
-        # Read image bytes with size limit (10MB)
-        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-        image_bytes = await file.read()
-
-        if len(image_bytes) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB"
-            )
+        # Read image in chunks, rejecting it as soon as it crosses the size limit
+        buffer = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            buffer += chunk
+            if len(buffer) > MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB"
+                )
+        image_bytes = bytes(buffer)
+        del buffer
 
         if len(image_bytes) == 0:
             raise HTTPException(status_code=400, detail="File is empty")
 
-        # Extract book titles using Vision Language Model
-        detected_titles = await VisionService.extract_book_titles(image_bytes)
+        # Extract book titles using Vision Language Model; the user's library
+        # doesn't depend on the scan, so fetch it while the model runs
+        detected_titles, user_library = await asyncio.gather(
+            VisionService.extract_book_titles(image_bytes),
+            RecommendationService.get_user_library_books(
+                session, str(current_user.id)
+            ),
+        )
 
         if not detected_titles:
             return ScanResult(detected_books=[], recommendations=[])
 
-        # Search for each title in Google Books (in parallel)
-        async def search_title(title_data: dict[str, Any]) -> dict[str, Any] | None:
-            book_data = await GoogleBooksService.fuzzy_search_book(
-                title_data["title"], author=title_data.get("author")
-            )
+        # Look titles up in OR-batched Google Books queries first (in parallel)
+        async def search_batch(
+            batch: list[dict[str, Any]],
+        ) -> list[BookHit | None]:
+            async with google_books_semaphore:
+                return await GoogleBooksService.batch_fuzzy_search(
+                    [(title_data["title"], title_data.get("author")) for title_data in batch]
+                )
+
+        batches = [
+            detected_titles[i : i + BATCH_QUERY_SIZE]
+            for i in range(0, len(detected_titles), BATCH_QUERY_SIZE)
+        ]
+        batch_results = await asyncio.gather(
+            *[search_batch(batch) for batch in batches], return_exceptions=True
+        )
+        batch_matches: list[BookHit | None] = []
+        for batch, result in zip(batches, batch_results, strict=True):
+            if isinstance(result, BaseException):
+                batch_matches.extend([None] * len(batch))
+            else:
+                batch_matches.extend(result)
+
+        # Fall back to an individual fuzzy search for titles the batch missed
+        async def search_title(
+            title_data: dict[str, Any], book_data: BookHit | None
+        ) -> BookHit | None:
+            if book_data is None:
+                async with google_books_semaphore:
+                    book_data = await GoogleBooksService.fuzzy_search_book(
+                        title_data["title"], author=title_data.get("author")
+                    )
             if book_data:
-                book_data["confidence"] = title_data["confidence"]
+                book_data.confidence = title_data["confidence"]
                 return book_data
             return None
 
         search_results = await asyncio.gather(
-            *[search_title(title_data) for title_data in detected_titles],
+            *[
+                search_title(title_data, book_data)
+                for title_data, book_data in zip(detected_titles, batch_matches, strict=True)
+            ],
             return_exceptions=True
         )
 
         # Filter out None results and exceptions
-        detected_books_list: list[dict[str, Any]] = [
-            book for book in search_results
-            if book is not None and not isinstance(book, Exception)
+        detected_books_list = [
+            book for book in search_results if isinstance(book, BookHit)
         ]
 
-        # Get user's library
-        user_library = RecommendationService.get_user_library_books(
-            session, str(current_user.id)
-        )
-
         # Generate recommendations
         all_books, recommendations = (
             await RecommendationService.filter_and_rank_recommendations(
@@ -105,25 +150,28 @@ async def scan_books(
             )
         )
 
-        # Helper to convert dict to DetectedBook model
-        def to_detected_book(book: dict[str, Any], in_library: bool = False) -> DetectedBook:
-            return DetectedBook(
-                title=book["title"],
-                author=book.get("author"),
-                isbn=book.get("isbn"),
-                thumbnail_url=book.get("thumbnail_url"),
-                google_books_id=book.get("google_books_id"),
-                confidence=book.get("confidence", 0.0),
-                match_score=book.get("match_score", 0.0),
-                in_library=in_library,
-                recommendation_explanation=book.get("recommendation_explanation"),
+        # Helper to convert a BookHit to the DetectedBook response model.
+        # Fields come from our own pipeline, so skip validation.
+        def to_detected_book(book: BookHit) -> DetectedBook:
+            return DetectedBook.model_construct(
+                title=book.title,
+                author=book.author,
+                isbn=book.isbn,
+                thumbnail_url=book.thumbnail_url,
+                google_books_id=book.google_books_id,
+                confidence=book.confidence,
+                match_score=book.match_score,
+                in_library=book.in_library,
+                recommendation_explanation=book.recommendation_explanation,
             )
 
-        # Convert to response models
-        detected_books = [to_detected_book(book, book.get("in_library", False)) for book in all_books]
-        recommendation_books = [to_detected_book(book) for book in recommendations]
+        # Convert each book once; recommendations are the not-in-library
+        # subset of all_books, so they share the same response objects
+        detected_by_book = {id(book): to_detected_book(book) for book in all_books}
+        detected_books = list(detected_by_book.values())
+        recommendation_books = [detected_by_book[id(book)] for book in recommendations]
 
-        return ScanResult(
+        return ScanResult.model_construct(
             detected_books=detected_books, recommendations=recommendation_books
         )
 
@@ -137,30 +185,29 @@ async def scan_books(
 
 @router.post("/library/add/{google_books_id}", response_model=BookPublic)
 async def add_book_to_library(
-    *, session: SessionDep, current_user: CurrentUser, google_books_id: str
+    *, session: AsyncSessionDep, current_user: CurrentUser, google_books_id: str
 ) -> Any:
     """
     Add a book to user's library by Google Books ID.
 
     This endpoint:
-    1. Fetches book details from Google Books API
-    2. Creates book in database if it doesn't exist
-    3. Adds to user's library
+    1. Rejects books already in the user's library (400)
+    2. Fetches book details from Google Books API
+    3. Upserts the book in the database
+    4. Adds to user's library
     """
-    # Check if book already in library
-    existing = session.exec(
-        select(UserLibrary)
+    # Check the library first, so a duplicate add costs neither a Google Books
+    # call nor a discarded write
+    existing_statement = (
+        select(UserLibrary.id)
         .join(Book)
         .where(
             UserLibrary.user_id == current_user.id,
             Book.google_books_id == google_books_id,
         )
-    ).first()
-
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Book already in your library"
-        )
+    )
+    if (await session.exec(existing_statement)).first() is not None:
+        raise HTTPException(status_code=400, detail="Book already in your library")
 
     # Fetch book details from Google Books
     book_data = await GoogleBooksService.get_book_by_id(google_books_id)
@@ -168,82 +215,97 @@ async def add_book_to_library(
     if not book_data:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    # Check if book exists in database
-    db_book = session.exec(
-        select(Book).where(Book.google_books_id == google_books_id)
-    ).first()
-
-    if not db_book:
-        # Create new book
-        db_book = Book(
-            title=book_data["title"],
-            author=book_data.get("author"),
-            isbn=book_data.get("isbn"),
-            publisher=book_data.get("publisher"),
-            published_date=book_data.get("published_date"),
-            description=book_data.get("description"),
-            page_count=book_data.get("page_count"),
-            categories=book_data.get("categories"),
-            thumbnail_url=book_data.get("thumbnail_url"),
-            google_books_id=google_books_id,
-            average_rating=book_data.get("average_rating"),
-            ratings_count=book_data.get("ratings_count"),
+    book_values = {
+        "title": book_data.title,
+        "author": book_data.author,
+        "isbn": book_data.isbn,
+        "publisher": book_data.publisher,
+        "published_date": book_data.published_date,
+        "description": book_data.description,
+        "page_count": book_data.page_count,
+        "categories": book_data.categories,
+        "thumbnail_url": book_data.thumbnail_url,
+        "average_rating": book_data.average_rating,
+        "ratings_count": book_data.ratings_count,
+    }
+
+    # Create the book, or refresh its metadata if another user already added it
+    book_statement = (
+        insert(Book)
+        .values(google_books_id=google_books_id, **book_values)
+        .on_conflict_do_update(index_elements=["google_books_id"], set_=book_values)
+        .returning(Book)
+        .execution_options(populate_existing=True)
+    )
+    db_book = (await session.scalars(book_statement)).one()
+
+    # Add to user's library; no row back means a concurrent request added it
+    # since the check above
+    library_statement = (
+        insert(UserLibrary)
+        .values(user_id=current_user.id, book_id=db_book.id)
+        .on_conflict_do_nothing(index_elements=["user_id", "book_id"])
+        .returning(col(UserLibrary.id))
+    )
+    if (await session.scalars(library_statement)).first() is None:
+        await session.rollback()
+        raise HTTPException(
+            status_code=400, detail="Book already in your library"
         )
-        session.add(db_book)
-        session.commit()
-        session.refresh(db_book)
 
-    # Add to user's library
-    user_library_entry = UserLibrary(
-        user_id=current_user.id, book_id=db_book.id
-    )
-    session.add(user_library_entry)
-    session.commit()
-    session.refresh(db_book)
+    await session.commit()
+    await session.refresh(db_book)
 
     return db_book
 
 
 @router.delete("/library/remove/{book_id}")
 async def remove_book_from_library(
-    *, session: SessionDep, current_user: CurrentUser, book_id: uuid.UUID
+    *, session: AsyncSessionDep, current_user: CurrentUser, book_id: uuid.UUID
 ) -> Any:
     """Remove a book from user's library."""
-    user_library_entry = session.exec(
-        select(UserLibrary).where(
-            UserLibrary.user_id == current_user.id,
-            UserLibrary.book_id == book_id,
+    user_library_entry = (
+        await session.exec(
+            select(UserLibrary).where(
+                UserLibrary.user_id == current_user.id,
+                UserLibrary.book_id == book_id,
+            )
         )
     ).first()
 
     if not user_library_entry:
         raise HTTPException(status_code=404, detail="Book not in your library")
 
-    session.delete(user_library_entry)
-    session.commit()
+    await session.delete(user_library_entry)
+    await session.commit()
 
     return {"message": "Book removed from library"}
 
 
 @router.get("/library", response_model=BooksPublic)
-def get_user_library(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def get_user_library(
+    session: AsyncSessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
 ) -> Any:
     """Get all books in user's library."""
-    count_statement = (
-        select(func.count())
-        .select_from(UserLibrary)
-        .where(UserLibrary.user_id == current_user.id)
-    )
-    count = session.exec(count_statement).one()
-
+    # Total count rides along on every row via a window function
     statement = (
-        select(Book)
+        select(Book, func.count().over().label("total"))
         .join(UserLibrary)
         .where(UserLibrary.user_id == current_user.id)
         .offset(skip)
         .limit(limit)
     )
-    books = session.exec(statement).all()
+    rows = (await session.execute(statement)).all()
+
+    if rows:
+        count = rows[0].total
+    else:
+        # No rows (empty library or skip past the end); count separately
+        count_statement = (
+            select(func.count())
+            .select_from(UserLibrary)
+            .where(UserLibrary.user_id == current_user.id)
+        )
+        count = (await session.exec(count_statement)).one()
 
-    return BooksPublic(data=list(books), count=count)
+    return BooksPublic(data=[row.Book for row in rows], count=count)
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.models import Message, ProviderHealth
+from app.services.llm.factory import get_provider_stats
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +30,16 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/health/providers/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+async def provider_health() -> dict[str, ProviderHealth]:
+    """
+    Recent success rate, latency (seconds) and call count of each LLM provider.
+    """
+    return {
+        name: ProviderHealth(**stats) for name, stats in get_provider_stats().items()
+    }
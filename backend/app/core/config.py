@@ -68,6 +68,13 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Connection pool, per engine (sync + async) and per worker process.
+    # Keep workers * 2 * (size + overflow) below Postgres max_connections (100).
+    DB_POOL_SIZE: int = 8
+    DB_MAX_OVERFLOW: int = 4
+    DB_POOL_RECYCLE: int = 3600  # Seconds
+    DB_POOL_PRE_PING: bool = True
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -100,6 +107,9 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str | None = None
     GOOGLE_API_KEY: str | None = None
     LLM_ENABLED: bool = True  # REQUIRED: Vision Language Models used for title extraction
+    LLM_HEDGE_DELAY_MS: int = 0  # Start the next fallback provider after this delay (0 = sequential)
+    LLM_HTTP_MAX_CONNECTIONS: int = 200  # Shared connection pool for OpenAI/Anthropic calls
+    LLM_HTTP_MAX_KEEPALIVE: int = 100
 
     # Vision Service Settings
     OCR_MIN_TITLE_LENGTH: int = 2  # Allow short titles like "It", "Go"
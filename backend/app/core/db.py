@@ -1,10 +1,23 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+pool_options = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), **pool_options)
+# Async engine for endpoints that shouldn't block the event loop on DB I/O
+# (psycopg 3 provides the async driver for the same URL)
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI), **pool_options
+)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
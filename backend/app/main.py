@@ -1,3 +1,6 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
@@ -8,6 +11,9 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine
+from app.services.google_books_service import GoogleBooksService
+from app.services.llm.factory import aclose_providers
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -17,6 +23,16 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Release pooled outbound and database connections on shutdown
+    await GoogleBooksService.aclose()
+    await aclose_providers()
+    await async_engine.dispose()
+
+
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
@@ -24,6 +40,7 @@ app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Add rate limiter to app state
@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 
 from pydantic import EmailStr
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -113,6 +114,15 @@ class BooksPublic(SQLModel):
 
 # User Library - Junction table between User and Book
 class UserLibrary(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("user_id", "book_id", name="uq_userlibrary_user_book"),
+        Index(
+            "ix_userlibrary_user_book_covering",
+            "user_id",
+            postgresql_include=["book_id", "added_date"],
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
     book_id: uuid.UUID = Field(foreign_key="book.id", nullable=False, ondelete="CASCADE")
@@ -140,3 +150,10 @@ class DetectedBook(SQLModel):
 class ScanResult(SQLModel):
     detected_books: list[DetectedBook]
     recommendations: list[DetectedBook]  # Books not in library, sorted by relevance
+
+
+# Recent health of an LLM provider
+class ProviderHealth(SQLModel):
+    success_rate: float
+    latency: float  # Seconds
+    calls: int
@@ -1,24 +1,177 @@
 """Google Books API service for book metadata retrieval."""
 
-import json
+import asyncio
 import logging
+import random
+from dataclasses import dataclass, replace
 from typing import Any
 
 import httpx
-from fuzzywuzzy import fuzz
+import orjson
+from cachetools import TTLCache
+from rapidfuzz import fuzz, process
+
+from app.services.text import normalize_text
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class BookHit:
+    """Book metadata from Google Books, annotated as it moves through a scan."""
+
+    title: str
+    author: str | None = None
+    isbn: str | None = None
+    publisher: str | None = None
+    published_date: str | None = None
+    description: str | None = None
+    page_count: int | None = None
+    categories: str | None = None  # JSON string of categories
+    thumbnail_url: str | None = None
+    google_books_id: str | None = None
+    average_rating: float | None = None
+    ratings_count: int | None = None
+
+    # Filled in by matching, scanning and recommendation ranking
+    match_score: float = 0.0
+    confidence: float = 0.0
+    in_library: bool = False
+    recommendation_explanation: str | None = None
+
+
+# Retry policy for rate limiting (429) and transient server errors (5xx)
+MAX_RETRIES = 1
+RETRY_BASE_DELAY = 0.5  # Seconds, doubled on each attempt
+RETRY_MAX_DELAY = 5.0  # Never wait longer than this, even if Retry-After asks to
+
+# Batched title lookups: titles per OR-joined query and results requested
+BATCH_QUERY_SIZE = 5
+BATCH_MAX_RESULTS = 40
+
+# Lookup cache settings. Misses (None) expire quickly so that a transient API
+# failure doesn't hide a book for the full TTL.
+CACHE_MAXSIZE = 4096
+CACHE_TTL = 3600  # Seconds
+NEGATIVE_CACHE_TTL = 60  # Seconds
+
+_lookup_cache: TTLCache[tuple[Any, ...], BookHit] = TTLCache(
+    maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL
+)
+_negative_cache: TTLCache[tuple[Any, ...], bool] = TTLCache(
+    maxsize=CACHE_MAXSIZE, ttl=NEGATIVE_CACHE_TTL
+)
+
+
+def _cache_get(key: tuple[Any, ...]) -> tuple[bool, BookHit | None]:
+    """
+    Look up a cached book.
+
+    Returns a (hit, book) tuple. Books are copied because callers annotate
+    the returned object in place (match_score, confidence, ...).
+    """
+    if key in _negative_cache:
+        return True, None
+    book = _lookup_cache.get(key)
+    if book is None:
+        return False, None
+    return True, replace(book)
+
+
+def _cache_set(key: tuple[Any, ...], book: BookHit | None) -> None:
+    """Store a lookup result (None is cached with the shorter negative TTL)."""
+    if book is None:
+        _negative_cache[key] = True
+    else:
+        _lookup_cache[key] = replace(book)
+
+
+# Shared client so connections and TLS sessions to googleapis.com are reused
+# across lookups instead of being re-established on every call.
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
+    return _client
+
+
 class GoogleBooksService:
     """Service for interacting with Google Books API."""
 
     BASE_URL = "https://www.googleapis.com/books/v1/volumes"
 
+    @staticmethod
+    async def aclose() -> None:
+        """Close the shared HTTP client (called on application shutdown)."""
+        global _client
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """
+        Work out how long to wait before retrying a throttled request.
+
+        Honours a numeric Retry-After header when present, otherwise uses
+        exponential backoff with jitter.
+
+        Args:
+            response: The 429/5xx response
+            attempt: Zero-based attempt number that just failed
+
+        Returns:
+            Delay in seconds
+        """
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), RETRY_MAX_DELAY)
+
+        backoff = RETRY_BASE_DELAY * 2.0**attempt
+        return min(backoff + random.uniform(0, RETRY_BASE_DELAY), RETRY_MAX_DELAY)
+
+    @staticmethod
+    async def _get(url: str, params: dict[str, Any] | None = None) -> httpx.Response:
+        """
+        GET a Google Books URL, retrying on 429 and 5xx responses.
+
+        Args:
+            url: Request URL
+            params: Optional query parameters
+
+        Returns:
+            Successful response
+
+        Raises:
+            httpx.HTTPStatusError: If the final attempt still fails
+        """
+        attempt = 0
+        while True:
+            response = await _get_client().get(url, params=params, timeout=10.0)
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt >= MAX_RETRIES:
+                response.raise_for_status()
+                return response
+
+            delay = GoogleBooksService._retry_delay(response, attempt)
+            logger.warning(
+                f"Google Books API returned {response.status_code}, retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
     @staticmethod
     async def search_book(
         query: str, max_results: int = 5
-    ) -> list[dict[str, Any]]:
+    ) -> list[BookHit]:
         """
         Search for books using Google Books API.
 
@@ -27,26 +180,24 @@ class GoogleBooksService:
             max_results: Maximum number of results to return
 
         Returns:
-            List of book metadata dictionaries
+            List of parsed books
         """
         try:
-            async with httpx.AsyncClient() as client:
-                params = {"q": query, "maxResults": max_results}
-                response = await client.get(
-                    GoogleBooksService.BASE_URL, params=params, timeout=10.0
-                )
-                response.raise_for_status()
+            params = {"q": query, "maxResults": max_results}
+            response = await GoogleBooksService._get(
+                GoogleBooksService.BASE_URL, params=params
+            )
 
-                data = response.json()
-                items = data.get("items", [])
+            data = orjson.loads(response.content)
+            items = data.get("items", [])
 
-                books = []
-                for item in items:
-                    book_data = GoogleBooksService._parse_book_item(item)
-                    if book_data:
-                        books.append(book_data)
+            books = []
+            for item in items:
+                book_data = GoogleBooksService._parse_book_item(item)
+                if book_data:
+                    books.append(book_data)
 
-                return books
+            return books
         except httpx.HTTPStatusError as e:
             logger.error(
                 f"Google Books API HTTP error for query '{query}': {e.response.status_code} - {e.response.text}"
@@ -63,7 +214,7 @@ class GoogleBooksService:
             return []
 
     @staticmethod
-    async def get_book_by_id(google_books_id: str) -> dict[str, Any] | None:
+    async def get_book_by_id(google_books_id: str) -> BookHit | None:
         """
         Get book details by Google Books ID.
 
@@ -71,16 +222,21 @@ class GoogleBooksService:
             google_books_id: Google Books volume ID
 
         Returns:
-            Book metadata dictionary or None
+            Parsed book or None
         """
+        cache_key = ("id", google_books_id)
+        hit, cached = _cache_get(cache_key)
+        if hit:
+            return cached
+
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"{GoogleBooksService.BASE_URL}/{google_books_id}"
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
+            url = f"{GoogleBooksService.BASE_URL}/{google_books_id}"
+            response = await GoogleBooksService._get(url)
 
-                data = response.json()
-                return GoogleBooksService._parse_book_item(data)
+            data = orjson.loads(response.content)
+            book = GoogleBooksService._parse_book_item(data)
+            _cache_set(cache_key, book)
+            return book
         except httpx.HTTPStatusError as e:
             logger.error(
                 f"Google Books API HTTP error for ID '{google_books_id}': {e.response.status_code}"
@@ -97,7 +253,7 @@ class GoogleBooksService:
             return None
 
     @staticmethod
-    def _parse_book_item(item: dict[str, Any]) -> dict[str, Any] | None:
+    def _parse_book_item(item: dict[str, Any]) -> BookHit | None:
         """
         Parse Google Books API item into our book format.
 
@@ -105,7 +261,7 @@ class GoogleBooksService:
             item: Raw item from Google Books API
 
         Returns:
-            Parsed book data dictionary
+            Parsed book
         """
         try:
             volume_info = item.get("volumeInfo", {})
@@ -135,22 +291,22 @@ class GoogleBooksService:
 
             # Get categories
             categories = volume_info.get("categories", [])
-            categories_str = json.dumps(categories) if categories else None
-
-            return {
-                "title": volume_info.get("title", "Unknown"),
-                "author": author,
-                "isbn": isbn,
-                "publisher": volume_info.get("publisher"),
-                "published_date": volume_info.get("publishedDate"),
-                "description": volume_info.get("description"),
-                "page_count": volume_info.get("pageCount"),
-                "categories": categories_str,
-                "thumbnail_url": thumbnail_url,
-                "google_books_id": item.get("id"),
-                "average_rating": volume_info.get("averageRating"),
-                "ratings_count": volume_info.get("ratingsCount"),
-            }
+            categories_str = orjson.dumps(categories).decode() if categories else None
+
+            return BookHit(
+                title=volume_info.get("title", "Unknown"),
+                author=author,
+                isbn=isbn,
+                publisher=volume_info.get("publisher"),
+                published_date=volume_info.get("publishedDate"),
+                description=volume_info.get("description"),
+                page_count=volume_info.get("pageCount"),
+                categories=categories_str,
+                thumbnail_url=thumbnail_url,
+                google_books_id=item.get("id"),
+                average_rating=volume_info.get("averageRating"),
+                ratings_count=volume_info.get("ratingsCount"),
+            )
         except KeyError as e:
             logger.warning(f"Missing required field in book item: {str(e)}")
             return None
@@ -158,10 +314,116 @@ class GoogleBooksService:
             logger.error(f"Error parsing book item: {str(e)}")
             return None
 
+    @staticmethod
+    def _search_cache_key(
+        title: str, author: str | None, threshold: int
+    ) -> tuple[Any, ...]:
+        """Build the lookup cache key for a fuzzy title/author search."""
+        return ("search", normalize_text(title), normalize_text(author or ""), threshold)
+
+    @staticmethod
+    def _lowered_candidates(
+        results: list[BookHit],
+    ) -> tuple[list[str], list[str]]:
+        """
+        Normalize candidate titles and authors once for fuzzy matching.
+
+        Args:
+            results: Candidate books from Google Books
+
+        Returns:
+            Tuple of (titles, authors), index-aligned with results
+        """
+        titles = [normalize_text(book.title) for book in results]
+        authors = [normalize_text(book.author or "") for book in results]
+        return titles, authors
+
+    @staticmethod
+    def _best_match(
+        title: str,
+        author: str | None,
+        results: list[BookHit],
+        threshold: int,
+        candidates: tuple[list[str], list[str]] | None = None,
+    ) -> BookHit | None:
+        """
+        Pick the search result that best matches a title (and author).
+
+        Args:
+            title: Book title (may contain OCR errors)
+            author: Book author (optional)
+            results: Candidate books from Google Books
+            threshold: Minimum fuzzy match score (0-100)
+            candidates: Output of _lowered_candidates(results), when the
+                same results are matched against several titles
+
+        Returns:
+            Copy of the best matching book with match_score set, or None
+        """
+        title_choices, author_choices = (
+            candidates or GoogleBooksService._lowered_candidates(results)
+        )
+        title_l = normalize_text(title)
+        author_l = normalize_text(author) if author else ""
+
+        # Clean OCR usually reproduces the title exactly; skip scoring then.
+        # A hit without an author only counts once no hit matches the author.
+        authorless_hit = None
+        for i, (book_title, book_author) in enumerate(
+            zip(title_choices, author_choices, strict=True)
+        ):
+            if book_title != title_l:
+                continue
+            if not author_l or book_author == author_l:
+                return replace(results[i], match_score=1.0)
+            if not book_author and authorless_hit is None:
+                authorless_hit = i
+        if authorless_hit is not None:
+            return replace(results[authorless_hit], match_score=1.0)
+
+        if not author:
+            # Title-only: let rapidfuzz find the argmax above the cutoff in C
+            best = process.extractOne(
+                title_l,
+                title_choices,
+                scorer=fuzz.token_sort_ratio,
+                score_cutoff=threshold,
+            )
+            if best is None:
+                return None
+            _, best_score, best_index = best
+            return replace(results[best_index], match_score=best_score / 100.0)
+
+        best_index = -1
+        best_score = 0.0
+
+        for i, (book_title, book_author) in enumerate(
+            zip(title_choices, author_choices, strict=True)
+        ):
+            # Calculate title similarity
+            title_score = fuzz.token_sort_ratio(title_l, book_title)
+
+            # Factor in the author when the candidate lists one
+            if book_author:
+                author_score = fuzz.token_sort_ratio(author_l, book_author)
+                # Weighted average: title 70%, author 30%
+                combined_score = title_score * 0.7 + author_score * 0.3
+            else:
+                combined_score = title_score
+
+            if combined_score > best_score and combined_score >= threshold:
+                best_score = combined_score
+                best_index = i
+
+        if best_index < 0:
+            return None
+
+        return replace(results[best_index], match_score=best_score / 100.0)
+
     @staticmethod
     async def fuzzy_search_book(
         title: str, author: str | None = None, threshold: int = 70
-    ) -> dict[str, Any] | None:
+    ) -> BookHit | None:
         """
         Search for a book with fuzzy matching to handle OCR errors.
 
@@ -173,6 +435,11 @@ class GoogleBooksService:
         Returns:
             Best matching book or None
         """
+        cache_key = GoogleBooksService._search_cache_key(title, author, threshold)
+        hit, cached = _cache_get(cache_key)
+        if hit:
+            return cached
+
         # Build query
         query = title
         if author:
@@ -181,32 +448,65 @@ class GoogleBooksService:
         # Search Google Books
         results = await GoogleBooksService.search_book(query, max_results=10)
 
-        if not results:
-            return None
+        best_match = GoogleBooksService._best_match(title, author, results, threshold)
 
-        # Find best match using fuzzy matching
-        best_match = None
-        best_score = 0
+        _cache_set(cache_key, best_match)
+        return best_match
 
-        for book in results:
-            # Calculate title similarity
-            title_score = fuzz.token_sort_ratio(
-                title.lower(), book.get("title", "").lower()
-            )
+    @staticmethod
+    async def batch_fuzzy_search(
+        titles: list[tuple[str, str | None]], threshold: int = 70
+    ) -> list[BookHit | None]:
+        """
+        Look up several titles with a single OR-joined Google Books query.
 
-            # If author provided, factor it into the score
-            if author and book.get("author"):
-                author_score = fuzz.token_sort_ratio(
-                    author.lower(), book.get("author", "").lower()
-                )
-                # Weighted average: title 70%, author 30%
-                combined_score = int(title_score * 0.7 + author_score * 0.3)
+        Each returned item is matched locally against every input title.
+        Titles without a good match come back as None so the caller can fall
+        back to fuzzy_search_book for them. Only matches are cached; misses
+        are left to the fallback search.
+
+        Args:
+            titles: (title, author) pairs, at most BATCH_QUERY_SIZE of them
+            threshold: Minimum fuzzy match score (0-100)
+
+        Returns:
+            Best matching book (or None) for each input, in the same order
+        """
+        matches: list[BookHit | None] = [None] * len(titles)
+        pending: list[int] = []
+
+        for i, (title, author) in enumerate(titles):
+            hit, cached = _cache_get(
+                GoogleBooksService._search_cache_key(title, author, threshold)
+            )
+            if hit:
+                matches[i] = cached
             else:
-                combined_score = title_score
+                pending.append(i)
 
-            if combined_score > best_score and combined_score >= threshold:
-                best_score = combined_score
-                best_match = book
-                best_match["match_score"] = combined_score / 100.0
+        if not pending:
+            return matches
 
-        return best_match
+        # Quotes would break the intitle:"..." phrase syntax
+        pending_titles = [titles[i][0].replace('"', "") for i in pending]
+        query = "|".join(f'intitle:"{title}"' for title in pending_titles)
+        results = await GoogleBooksService.search_book(
+            query, max_results=BATCH_MAX_RESULTS
+        )
+        if not results:
+            return matches
+
+        candidates = GoogleBooksService._lowered_candidates(results)
+        for i in pending:
+            title, author = titles[i]
+            best_match = GoogleBooksService._best_match(
+                title, author, results, threshold, candidates
+            )
+            if best_match:
+                _cache_set(
+                    GoogleBooksService._search_cache_key(title, author, threshold),
+                    best_match,
+                )
+                matches[i] = best_match
+
+        return matches
@@ -1,13 +1,324 @@
 """Base class for LLM providers."""
 
+import asyncio
 import hashlib
+import io
+import logging
 import random
+import re
 from abc import ABC, abstractmethod
+from functools import cached_property, lru_cache
 from typing import Any
 
+import httpx
+import orjson
+from cachetools import LRUCache
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
 # Configuration constants for LLM prompts
 MAX_DESCRIPTION_LENGTH = 300  # Characters to include from book descriptions
 MAX_LIBRARY_BOOKS = 50  # Maximum number of user library books to send to LLM (tokens are cheap!)
+LIBRARY_SUMMARY_CACHE_SIZE = 1024  # Formatted library sections kept per (user, library) pair
+BOOK_SUMMARY_CACHE_SIZE = 8192  # Formatted per-book summaries kept across requests
+MAX_BOOKS_PER_PROMPT = 16  # Detected books per scoring call; accuracy drops on larger batches
+DETECTED_BOOKS_TOKEN_BUDGET = 6000  # Estimated tokens of detected-book summaries per call
+CHARS_PER_TOKEN = 4  # Rough English text ratio, avoids a tokenizer dependency
+VISION_MAX_IMAGE_SIDE = 2048  # Longest side VLM APIs keep; larger images are downsampled server-side
+VISION_REENCODE_MIN_BYTES = 2 * 1024 * 1024  # Smaller uploads are sent untouched
+VISION_JPEG_QUALITY = 85  # Re-encoding quality, keeps spine text legible
+RATE_LIMIT_BACKOFF = 0.5  # Factor a provider's concurrency limit shrinks by on HTTP 429
+
+# Book metadata fields rendered into prompt summaries, in render order
+BOOK_SUMMARY_FIELDS = (
+    "title",
+    "author",
+    "categories",
+    "description",
+    "average_rating",
+    "ratings_count",
+)
+
+# Image media types by leading signature bytes (WebP is checked separately:
+# its signature is "RIFF", a 4-byte size, then "WEBP")
+IMAGE_SIGNATURES = {
+    b"\x89PNG": "image/png",
+    b"GIF8": "image/gif",
+}
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+# HEIF container brands (bytes 8-12, after the "ftyp" box type)
+HEIC_BRANDS = frozenset({b"heic", b"heix", b"hevc", b"hevx"})
+HEIF_BRANDS = frozenset({b"mif1", b"msf1"})
+
+# Markdown code fence some models wrap JSON responses in
+MARKDOWN_FENCE_RE = re.compile(r"^\s*```(?:json)?|```\s*$")
+
+# HTTP client shared by the SDK clients of all providers
+_http_client: httpx.AsyncClient | None = None
+
+# Formatted library prompt sections keyed by (user_id, library fingerprint).
+# Shared by all providers since they use the same prompt format.
+_library_summary_cache: LRUCache[tuple[str, str], str] = LRUCache(
+    maxsize=LIBRARY_SUMMARY_CACHE_SIZE
+)
+
+# Formatted book summaries keyed by the metadata fields that appear in them.
+# The same books recur across users' libraries, scans and retries.
+_book_summary_cache: LRUCache[tuple[Any, ...], str] = LRUCache(
+    maxsize=BOOK_SUMMARY_CACHE_SIZE
+)
+
+# Title extraction prompt sent with each scanned image, shared by all providers
+VISION_PROMPT = """Analyze this image of a bookshelf or book covers and extract all visible book titles with author names.
+
+For each book you can clearly identify, provide:
+1. title: The full book title (as accurately as you can read it)
+2. author: The author's name if visible on the cover/spine (null if not visible or unclear)
+3. confidence: Score from 0.0 to 1.0 based on how clearly you can read the title
+
+Rules:
+- Only include actual book titles you can see in the image
+- Extract author names separately in the "author" field - DO NOT include them in the title
+- If you can only partially read a title, include what you can see and lower the confidence
+- If text is blurry or unclear, give it a lower confidence score (0.3-0.6)
+- If text is crystal clear, give it a high confidence score (0.8-1.0)
+- Ignore ISBN numbers, prices, barcodes, or other metadata
+- Include both horizontal and vertical text (book spines)
+
+CRITICAL: Return ONLY valid JSON - no markdown formatting, no code blocks, no extra text.
+Your entire response must be ONLY the JSON array below:
+[{
+  "title": "The Hobbit",
+  "author": "J.R.R. Tolkien",
+  "confidence": 0.95
+}, {
+  "title": "1984",
+  "author": "George Orwell",
+  "confidence": 0.85
+}]
+
+If you cannot identify any book titles with reasonable confidence, return an empty array: []"""
+
+# Static instructions of the batch recommendation prompt. Sent as the system
+# prompt so it forms an identical prefix across requests, which providers can
+# serve from their prompt cache; only the user message varies per call.
+BATCH_SYSTEM_PROMPT = """You are a book recommendation expert. Analyze how well each detected book matches a user's reading preferences based on their library.
+
+For EACH detected book (in order), provide:
+1. A match score from 0.0 to 1.0 (where 1.0 is a perfect match for this reader)
+2. A brief, user-friendly explanation (1-2 sentences) of why this book would interest them based on their reading history
+
+Consider:
+- Genre and category overlap
+- Author familiarity
+- Thematic similarities
+- Writing style patterns
+- Reading level and complexity
+- Popularity and ratings (balance widely-loved books with hidden gems based on reader count)
+
+Respond in this exact JSON format (a "results" array with one entry per book):
+{"results": [
+  {"title": "Exact title from Book 0", "score": 0.85, "explanation": "This book shares the accessible non-fiction style you enjoyed in Gladwell's works, with a focus on self-improvement themes."},
+  {"title": "Exact title from Book 1", "score": 0.65, "explanation": "While fantasy isn't your usual genre, this book's character-driven narrative aligns with your preference for literary fiction."},
+  ...
+]}
+
+CRITICAL Requirements:
+- Return exactly one result per detected book, in the order given
+- MUST include the "title" field with the EXACT title from each book (copy it precisely from the "Title:" field in each Book section)
+- The title is used to match your response to the correct book - if you return wrong/missing titles, the system will fail
+- Write explanations in second person ("you", "your") to speak directly to the reader
+- DO NOT reference "Book 0", "Book 1" or use technical indexing in the explanation - speak naturally about the book itself
+- Only respond with the JSON object, no other text."""
+BATCH_PROMPT_BOOKS_HEADER = "Detected books to evaluate:\n"
+
+
+def detect_image_media_type(
+    image_bytes: bytes, default: str | None = "image/jpeg"
+) -> str | None:
+    """
+    Detect an image's media type from its signature bytes.
+
+    Args:
+        image_bytes: Raw image bytes
+        default: Value returned for unrecognized formats
+
+    Returns:
+        Media type such as "image/png", or default when unrecognized
+    """
+    media_type = IMAGE_SIGNATURES.get(image_bytes[:4])
+    if media_type:
+        return media_type
+    if image_bytes[:3] == JPEG_SIGNATURE:
+        return "image/jpeg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[4:8] == b"ftyp":
+        brand = image_bytes[8:12]
+        if brand in HEIC_BRANDS:
+            return "image/heic"
+        if brand in HEIF_BRANDS:
+            return "image/heif"
+    # VLM APIs reject unsupported types with a clear error
+    return default
+
+
+def prepare_vision_image(image_bytes: bytes) -> bytes:
+    """
+    Shrink an oversized photo before it is uploaded to a vision API.
+
+    Images over VISION_REENCODE_MIN_BYTES are downscaled to at most
+    VISION_MAX_IMAGE_SIDE pixels and re-encoded as JPEG. VLM APIs downsample
+    larger images anyway, so this only cuts upload time. CPU-bound; call it
+    off the event loop.
+
+    Args:
+        image_bytes: Raw image bytes
+
+    Returns:
+        Re-encoded JPEG bytes, or the original bytes if they are already small,
+        can't be decoded, or re-encoding doesn't make them smaller
+    """
+    if len(image_bytes) <= VISION_REENCODE_MIN_BYTES:
+        return image_bytes
+
+    try:
+        image: Image.Image = Image.open(io.BytesIO(image_bytes))
+        # Let JPEG decode at a reduced scale instead of full resolution
+        image.draft("RGB", (VISION_MAX_IMAGE_SIDE, VISION_MAX_IMAGE_SIDE))
+        image.thumbnail((VISION_MAX_IMAGE_SIDE, VISION_MAX_IMAGE_SIDE))
+        # Bake in the EXIF rotation, which re-encoding would otherwise drop
+        image = ImageOps.exif_transpose(image)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=VISION_JPEG_QUALITY)
+    except Exception as e:
+        logger.warning(f"Could not downscale image for VLM, sending original: {e}")
+        return image_bytes
+
+    prepared = buffer.getvalue()
+    if len(prepared) >= len(image_bytes):
+        return image_bytes
+    logger.info(f"Downscaled image for VLM: {len(image_bytes)} -> {len(prepared)} bytes")
+    return prepared
+
+
+def strip_markdown_fence(content: str) -> str:
+    """
+    Remove a surrounding markdown code fence (```json ... ```) from an LLM response.
+
+    Args:
+        content: Raw LLM response text
+
+    Returns:
+        Response text without the fence and surrounding whitespace
+    """
+    return MARKDOWN_FENCE_RE.sub("", content).strip()
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """
+    Return the HTTP client shared by provider SDKs, creating it on first use.
+
+    One pool sized from settings replaces a default-sized pool per SDK client,
+    so keep-alive connections are reused across providers and requests. HTTP/2
+    multiplexes concurrent calls to a provider over a single TLS connection.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                # Keep idle connections well past httpx's 5s default, so scans
+                # a few seconds apart skip a new TLS handshake
+                keepalive_expiry=30.0,
+            ),
+        )
+    return _http_client
+
+
+async def close_shared_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@lru_cache(maxsize=4096)
+def format_popularity(ratings_count: int) -> str:
+    """
+    Format a ratings count with thousands separators.
+
+    Popular books share the same counts across many libraries, so the
+    formatted strings are memoized.
+
+    Args:
+        ratings_count: Number of ratings
+
+    Returns:
+        Comma-separated count, e.g. "12,345"
+    """
+    return f"{ratings_count:,}"
+
+
+def library_fingerprint(library: list[dict[str, Any]]) -> str:
+    """
+    Hash every field of a library's books that the prompt renders, in order.
+
+    Args:
+        library: Library books as sent to the LLM
+
+    Returns:
+        Short hex digest that changes whenever books are added, removed,
+        reordered or their rendered metadata (e.g. ratings) changes
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for book in library:
+        fields = "\x1f".join(str(book.get(field)) for field in BOOK_SUMMARY_FIELDS)
+        digest.update(f"{fields}\x1e".encode())
+    return digest.hexdigest()
+
+
+def dedupe_library_books(library: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Drop repeated books (other editions, re-imports) from a library.
+
+    Books are identified by case-insensitive title and author; the first
+    occurrence is kept so the library order is preserved.
+
+    Args:
+        library: Library books as sent to the LLM
+
+    Returns:
+        Library without duplicates (the same list if there were none)
+    """
+    unique: dict[tuple[str, str], dict[str, Any]] = {}
+    for book in library:
+        key = (
+            (book.get("title") or "").strip().casefold(),
+            (book.get("author") or "").strip().casefold(),
+        )
+        if key not in unique:
+            unique[key] = book
+
+    if len(unique) == len(library):
+        return library
+    return list(unique.values())
+
+
+@lru_cache(maxsize=10_000)
+def _library_seed(user_id: str) -> int:
+    """Derive a stable sampling seed from a user ID."""
+    return int.from_bytes(
+        hashlib.blake2b(user_id.encode(), digest_size=4, person=b"libseed").digest(),
+        "little",
+    )
 
 
 def sample_library_books(
@@ -30,15 +341,93 @@ def sample_library_books(
     if len(library) <= max_books:
         return library
 
-    # Create deterministic seed from user_id
-    seed = int(hashlib.md5(user_id.encode()).hexdigest()[:8], 16)
+    # Pick max_books indices with a deterministic seed (same user = same sample
+    # every time) without copying or shuffling the whole library
+    rng = random.Random(_library_seed(user_id))
+    indices = rng.sample(range(len(library)), max_books)
 
-    # Shuffle with deterministic seed (same user = same shuffle every time)
-    shuffled = library.copy()
-    rng = random.Random(seed)
-    rng.shuffle(shuffled)
+    return [library[i] for i in indices]
 
-    return shuffled[:max_books]
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    Check whether an error (or the SDK error it wraps) is an HTTP 429.
+
+    Providers wrap SDK exceptions in RuntimeError, so the cause chain is
+    searched. OpenAI and Anthropic errors carry status_code, Google API
+    errors carry code.
+    """
+    cause: BaseException | None = error
+    while cause is not None:
+        if 429 in (getattr(cause, "status_code", None), getattr(cause, "code", None)):
+            return True
+        cause = cause.__cause__
+    return False
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Async concurrency limit that backs off when a provider rate-limits.
+
+    Additive increase, multiplicative decrease: a rate-limited call cuts the
+    limit by RATE_LIMIT_BACKOFF (down to 1), and each successful call grows it
+    by 1/limit, i.e. about one slot per round of calls, up to max_limit.
+    """
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._waiters: list[asyncio.Future[None]] = []
+
+    async def acquire(self) -> None:
+        """Wait for a free slot and take it."""
+        while self._in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Pass a wake-up this task can no longer use to the next waiter
+                self._wake_waiters()
+                raise
+            finally:
+                self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def release(self, error: BaseException | None = None, *, used: bool = True) -> None:
+        """
+        Give back a slot, adjusting the limit by the outcome of its call.
+
+        Args:
+            error: Exception the call raised, or None if it succeeded
+            used: False if no call was made with the slot; the limit is
+                left unchanged
+        """
+        if used:
+            if error is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif is_rate_limit_error(error):
+                self.limit = max(1.0, self.limit * RATE_LIMIT_BACKOFF)
+                logger.warning(f"Rate limited, concurrency limit lowered to {int(self.limit)}")
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, exc_type: Any, exc: BaseException | None, tb: Any) -> None:
+        self.release(exc)
+
+    def _wake_waiters(self) -> None:
+        """Wake as many waiters as there are free slots."""
+        free = int(self.limit) - self._in_flight
+        for waiter in self._waiters:
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
 
 
 class LLMProvider(ABC):
@@ -49,17 +438,21 @@ class LLMProvider(ABC):
         self,
         detected_books: list[dict[str, Any]],
         user_library: list[dict[str, Any]],
-    ) -> list[tuple[float, str]]:
+        user_id: str | None = None,
+    ) -> list[dict[str, Any]]:
         """
         Calculate match scores for multiple books in a single LLM call.
 
         Args:
             detected_books: List of book metadata to evaluate
             user_library: List of books in user's library with metadata
+            user_id: Owner of the library, used to cache its prompt section
 
         Returns:
-            List of tuples (match_score, explanation) in the same order as detected_books
-            - match_score: Float between 0.0 and 1.0
+            List of dicts with keys title, score and explanation, normally in
+            the same order as detected_books
+            - title: Book title as echoed by the model
+            - score: Float between 0.0 and 1.0
             - explanation: Human-readable explanation of the recommendation
         """
         pass
@@ -87,118 +480,309 @@ class LLMProvider(ABC):
         """
         pass
 
+    # Scoring calls allowed in flight at once when a scan is split into batches
+    max_concurrent_scoring_calls: int = 8
+
+    def rate_limit_pause(self) -> float:
+        """
+        Seconds to hold off scoring calls because the provider's rate limit is
+        nearly used up (0 when calls may go ahead).
+        """
+        return 0.0
+
+    @cached_property
+    def _scoring_limit(self) -> AdaptiveConcurrencyLimit:
+        """Limit on this provider's concurrent scoring calls, lowered on 429s."""
+        return AdaptiveConcurrencyLimit(self.max_concurrent_scoring_calls)
+
+    async def score_detected_books(
+        self,
+        detected_books: list[dict[str, Any]],
+        user_library: list[dict[str, Any]],
+        user_id: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Score detected books, splitting large scans into concurrent prompts.
+
+        Each prompt batch is scored with calculate_batch_match_scores, with at
+        most max_concurrent_scoring_calls calls in flight per provider, fewer
+        while the provider is returning rate-limit errors. Batches wait out a
+        rate_limit_pause before taking a slot, so a pause doesn't hold slots.
+
+        Args:
+            detected_books: List of book metadata to evaluate
+            user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
+
+        Returns:
+            List of dicts with keys: title, score, explanation, in book order
+        """
+
+        async def score_batch(batch: list[dict[str, Any]]) -> list[dict[str, Any]]:
+            limit = self._scoring_limit
+            while True:
+                pause = self.rate_limit_pause()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                await limit.acquire()
+                if self.rate_limit_pause() <= 0:
+                    break
+                # A pause started while this batch queued for a slot; hand the
+                # slot back without counting it as a successful call
+                limit.release(used=False)
+
+            try:
+                results = await self.calculate_batch_match_scores(batch, user_library, user_id)
+            except BaseException as e:
+                limit.release(e)
+                raise
+            limit.release()
+            return results
+
+        batches = self.split_detected_books(detected_books)
+        if len(batches) == 1:
+            return await score_batch(detected_books)
+
+        logger.info(f"Scoring {len(detected_books)} books in {len(batches)} prompts")
+        tasks = [asyncio.create_task(score_batch(batch)) for batch in batches]
+        try:
+            # One failed batch fails the whole scan (and the provider fallback
+            # retries it), so stop paying for the other batches right away
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return [result for task in tasks for result in task.result()]
+
+    def split_detected_books(
+        self, detected_books: list[dict[str, Any]]
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Split detected books into batches that each fit one scoring prompt.
+
+        Books are packed greedily, in order, until a batch reaches
+        MAX_BOOKS_PER_PROMPT books or DETECTED_BOOKS_TOKEN_BUDGET estimated
+        tokens. The batches can then be scored concurrently.
+
+        Args:
+            detected_books: List of books to evaluate
+
+        Returns:
+            Non-empty list of book batches (a single batch for small scans)
+        """
+        batches: list[list[dict[str, Any]]] = []
+        batch: list[dict[str, Any]] = []
+        batch_tokens = 0
+
+        for book in detected_books:
+            tokens = len(self._format_book_summary(book)) // CHARS_PER_TOKEN + 1
+            if batch and (
+                len(batch) >= MAX_BOOKS_PER_PROMPT
+                or batch_tokens + tokens > DETECTED_BOOKS_TOKEN_BUDGET
+            ):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(book)
+            batch_tokens += tokens
+
+        batches.append(batch)
+        return batches
+
+    def _parse_match_scores(self, content: str) -> list[dict[str, Any]]:
+        """
+        Parse a batch scoring response into title/score/explanation dicts.
+
+        Args:
+            content: Raw LLM response text: the {"results": [...]} object every
+                provider is asked for, possibly in a markdown fence. A bare
+                array is accepted too, for models that drop the wrapper.
+
+        Returns:
+            List of dicts with keys: title, score, explanation
+
+        Raises:
+            orjson.JSONDecodeError: If the response isn't valid JSON
+            ValueError: If the response has no results array
+        """
+        # Parse JSON response, cleaning markdown code blocks if present
+        results = orjson.loads(strip_markdown_fence(content))
+        if isinstance(results, dict):
+            results = results.get("results")
+
+        if not isinstance(results, list):
+            raise ValueError("Expected a JSON object with a results array")
+
+        # Extract scores and explanations with title for safe matching
+        parsed_results = []
+        for result in results:
+            title = result.get("title", "")
+            score = float(result.get("score", 0.0))
+            explanation = result.get("explanation", "No explanation provided")
+            # Clamp score to valid range
+            score = max(0.0, min(1.0, score))
+            parsed_results.append({
+                "title": title,
+                "score": score,
+                "explanation": explanation
+            })
+
+        return parsed_results
+
     def _format_book_summary(self, book: dict[str, Any]) -> str:
         """
         Format book metadata into a concise summary for LLM context.
 
+        Summaries are memoized on the fields they are built from, so repeat
+        books cost a single cache lookup.
+
         Args:
             book: Book metadata dictionary
 
         Returns:
             Formatted string summary
         """
-        parts = []
+        key = tuple(book.get(field) for field in BOOK_SUMMARY_FIELDS)
+        summary = _book_summary_cache.get(key)
+        if summary is None:
+            summary = self._render_book_summary(*key)
+            _book_summary_cache[key] = summary
+        return summary
+
+    @staticmethod
+    def _render_book_summary(
+        title: str | None,
+        author: str | None,
+        categories: str | None,
+        description: str | None,
+        rating: float | None,
+        ratings_count: int | None,
+    ) -> str:
+        """
+        Build a book summary from its metadata fields.
+
+        Lines are newline-separated, with no trailing newline.
+
+        Returns:
+            Formatted string summary
+        """
+        parts: list[str] = []
 
-        if title := book.get("title"):
-            parts.append(f"Title: {title}")
+        if title:
+            parts += ("Title: ", title, "\n")
 
-        if author := book.get("author"):
-            parts.append(f"Author: {author}")
+        if author:
+            parts += ("Author: ", author, "\n")
 
-        if categories := book.get("categories"):
-            parts.append(f"Categories: {categories}")
+        if categories:
+            parts += ("Categories: ", categories, "\n")
 
-        if description := book.get("description"):
+        if description:
             # Truncate long descriptions to stay within token limits
-            desc = (
-                description[:MAX_DESCRIPTION_LENGTH] + "..."
-                if len(description) > MAX_DESCRIPTION_LENGTH
-                else description
-            )
-            parts.append(f"Description: {desc}")
+            if len(description) > MAX_DESCRIPTION_LENGTH:
+                parts += ("Description: ", description[:MAX_DESCRIPTION_LENGTH], "...\n")
+            else:
+                parts += ("Description: ", description, "\n")
 
-        if rating := book.get("average_rating"):
-            parts.append(f"Rating: {rating}/5")
+        if rating:
+            parts += ("Rating: ", str(rating), "/5\n")
 
         # Add ratings count (popularity signal)
-        if ratings_count := book.get("ratings_count"):
+        if ratings_count:
             # Format with commas for readability
-            parts.append(f"Popularity: {ratings_count:,} readers")
+            parts += ("Popularity: ", format_popularity(ratings_count), " readers\n")
 
-        return "\n".join(parts)
+        # Drop the trailing newline after the last line
+        return "".join(parts)[:-1]
 
-    def _build_batch_recommendation_prompt(
-        self,
-        detected_books: list[dict[str, Any]],
-        user_library: list[dict[str, Any]],
-    ) -> str:
+    def _format_library_summary(self, user_library: list[dict[str, Any]]) -> str:
         """
-        Build the prompt for the LLM to analyze multiple books at once.
+        Format the user's library section of the recommendation prompt.
 
         Args:
-            detected_books: List of books to evaluate
             user_library: User's library books
 
         Returns:
-            Formatted prompt string
+            Library summary text
         """
-        # Format user's library with full context
         if not user_library:
-            library_summary = "User has an empty library (new user)."
-        else:
-            # Limit number of books to stay within token limits
-            sampled_books = user_library[:MAX_LIBRARY_BOOKS]
-            library_items = []
-            for book in sampled_books:
-                book_summary = self._format_book_summary(book)
-                library_items.append(f"- {book_summary.replace(chr(10), ', ')}")  # Single line per book
+            return "User has an empty library (new user)."
 
-            library_summary = "User's library:\n" + "\n".join(library_items)
+        # Collect every fragment and join once, so the section isn't re-copied
+        # by each concatenation
+        parts = ["User's library:"]
 
-            if len(user_library) > MAX_LIBRARY_BOOKS:
-                remaining = len(user_library) - MAX_LIBRARY_BOOKS
-                library_summary += f"\n... and {remaining} more books"
+        # Limit number of books to stay within token limits
+        for book in user_library[:MAX_LIBRARY_BOOKS]:
+            # Single line per book
+            parts += ("\n- ", self._format_book_summary(book).replace("\n", ", "))
 
-        # Format detected books
-        books_summary = []
-        for i, book in enumerate(detected_books):
-            book_summary = self._format_book_summary(book)
-            books_summary.append(f"Book {i}:\n{book_summary}")
+        if len(user_library) > MAX_LIBRARY_BOOKS:
+            remaining = len(user_library) - MAX_LIBRARY_BOOKS
+            parts += ("\n... and ", str(remaining), " more books")
 
-        books_text = "\n\n".join(books_summary)
+        return "".join(parts)
 
-        prompt = f"""You are a book recommendation expert. Analyze how well each detected book matches a user's reading preferences based on their library.
+    def _get_library_summary(
+        self, user_library: list[dict[str, Any]], user_id: str | None
+    ) -> str:
+        """
+        Get the library prompt section, reusing a cached copy for the same user and library.
 
-{library_summary}
+        Args:
+            user_library: User's library books
+            user_id: Owner of the library (no caching when None)
 
-Detected books to evaluate:
-{books_text}
+        Returns:
+            Library summary text
+        """
+        if user_id is None:
+            return self._format_library_summary(user_library)
 
-For EACH book listed above (in order), provide:
-1. A match score from 0.0 to 1.0 (where 1.0 is a perfect match for this reader)
-2. A brief, user-friendly explanation (1-2 sentences) of why this book would interest them based on their reading history
+        key = (user_id, library_fingerprint(user_library))
+        library_summary = _library_summary_cache.get(key)
+        if library_summary is None:
+            library_summary = self._format_library_summary(user_library)
+            _library_summary_cache[key] = library_summary
+        return library_summary
 
-Consider:
-- Genre and category overlap
-- Author familiarity
-- Thematic similarities
-- Writing style patterns
-- Reading level and complexity
-- Popularity and ratings (balance widely-loved books with hidden gems based on reader count)
+    def _build_batch_user_prompt(
+        self,
+        detected_books: list[dict[str, Any]],
+        user_library: list[dict[str, Any]],
+        user_id: str | None = None,
+    ) -> tuple[str, str]:
+        """
+        Build the per-request part of the batch recommendation prompt.
 
-Respond in this exact JSON format (an array with one entry per book):
-[
-  {{"title": "Exact title from Book 0", "score": 0.85, "explanation": "This book shares the accessible non-fiction style you enjoyed in Gladwell's works, with a focus on self-improvement themes."}},
-  {{"title": "Exact title from Book 1", "score": 0.65, "explanation": "While fantasy isn't your usual genre, this book's character-driven narrative aligns with your preference for literary fiction."}},
-  ...
-]
+        The library section comes first: it only changes when the library does,
+        so together with BATCH_SYSTEM_PROMPT it forms a cacheable prefix.
 
-CRITICAL Requirements:
-- Return exactly {len(detected_books)} results (one per book)
-- MUST include the "title" field with the EXACT title from each book (copy it precisely from the "Title:" field in each Book section above)
-- The title is used to match your response to the correct book - if you return wrong/missing titles, the system will fail
-- Write explanations in second person ("you", "your") to speak directly to the reader
-- DO NOT reference "Book 0", "Book 1" or use technical indexing in the explanation - speak naturally about the book itself
-- Only respond with the JSON array, no other text."""
+        Args:
+            detected_books: List of books to evaluate
+            user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
+
+        Returns:
+            Tuple of (library_section, books_section)
+        """
+        library_summary = self._get_library_summary(user_library, user_id)
+
+        # Collect every fragment and join once at the end
+        parts = [BATCH_PROMPT_BOOKS_HEADER]
 
-        return prompt
+        # Format detected books
+        for i, book in enumerate(detected_books):
+            if i:
+                parts.append("\n\n")
+            parts += ("Book ", str(i), ":\n")
+            parts.append(self._format_book_summary(book))
+
+        parts += (
+            "\n\nReturn exactly ",
+            str(len(detected_books)),
+            " results (one per book).",
+        )
+
+        return library_summary + "\n\n", "".join(parts)
@@ -1,25 +1,237 @@
 """Factory for creating and managing LLM providers."""
 
+import asyncio
+import hashlib
+import importlib
 import logging
-from typing import Literal
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable, MutableMapping
+from dataclasses import dataclass
+from functools import cache, lru_cache
+from typing import Any, Literal, TypeVar
+
+import orjson
+from cachetools import TTLCache
 
 from app.core.config import settings
-from app.services.llm.base import LLMProvider
-from app.services.llm.providers.anthropic import AnthropicProvider
-from app.services.llm.providers.google import GoogleProvider
-from app.services.llm.providers.openai import OpenAIProvider
+from app.services.llm.base import (
+    LLMProvider,
+    close_shared_http_client,
+    library_fingerprint,
+    prepare_vision_image,
+    strip_markdown_fence,
+)
+from app.services.text import normalize_text
 
 logger = logging.getLogger(__name__)
 
 LLMProviderType = Literal["openai", "anthropic", "google"]
 
-# Provider class mapping (used by all fallback functions)
-PROVIDER_CLASSES = {
-    "openai": OpenAIProvider,
-    "anthropic": AnthropicProvider,
-    "google": GoogleProvider,
+T = TypeVar("T")
+
+# Provider classes as "module:Class" (used by all fallback functions). Imported
+# lazily so only the SDKs of configured providers are loaded.
+PROVIDER_CLASSES: dict[LLMProviderType, str] = {
+    "openai": "app.services.llm.providers.openai:OpenAIProvider",
+    "anthropic": "app.services.llm.providers.anthropic:AnthropicProvider",
+    "google": "app.services.llm.providers.google:GoogleProvider",
+}
+
+# Settings holding each provider's API key
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "google": "GOOGLE_API_KEY",
 }
 
+PROVIDER_AVAILABILITY_TTL = 60  # Seconds before re-checking a provider's configuration
+PROVIDER_PROBE_TIMEOUT = 0.5  # Seconds to wait for a single availability check
+BATCH_SCORE_CACHE_SIZE = 4096  # Scored (library, book) pairs kept in memory
+BATCH_SCORE_CACHE_TTL = 3600  # Seconds to reuse scores for a rescanned shelf
+PROVIDER_STATS_ALPHA = 0.2  # Weight of the newest call in a provider's moving averages
+PROVIDER_HEALTHY_SUCCESS_RATE = 0.5  # Below this, a provider is tried after healthy ones
+PROVIDER_RECOVERY_HALF_LIFE = 60  # Seconds for an idle provider's failure rate to halve
+EXTRACTION_CACHE_SIZE = 256  # Extracted title responses kept per image
+EXTRACTION_CACHE_TTL = 300  # Seconds to reuse titles for a re-uploaded image
+EXTRACTION_FAILURE_TTL = 30  # Seconds to fail fast on an image every provider just rejected
+# HTTP statuses meaning a provider refused the image itself (malformed, too
+# large, unsupported), as opposed to timeouts, rate limits or server errors
+REJECTED_IMAGE_STATUSES = frozenset({400, 413, 415, 422})
+
+# Deadlines (seconds) per provider call, so a hanging request can't block the
+# fallback chain
+VLM_PROVIDER_TIMEOUTS: dict[str, float] = {"openai": 20, "anthropic": 30, "google": 20}
+BATCH_SCORING_TIMEOUTS: dict[str, float] = dict.fromkeys(PROVIDER_CLASSES, 60)
+
+# is_available() results per provider name, refreshed so config changes are picked up
+_availability_cache: TTLCache[str, bool] = TTLCache(
+    maxsize=len(PROVIDER_CLASSES), ttl=PROVIDER_AVAILABILITY_TTL
+)
+
+# Scoring results per book, keyed by (library fingerprint, normalized title,
+# normalized author). Rescanning a shelf only sends books that weren't scored
+# recently to the LLM, and OCR/metadata variants of a book share one entry.
+# Any MutableMapping with expiry (e.g. a Redis-backed one) can replace it.
+_batch_score_cache: MutableMapping[tuple[str, str, str], dict[str, Any]] = TTLCache(
+    maxsize=BATCH_SCORE_CACHE_SIZE, ttl=BATCH_SCORE_CACHE_TTL
+)
+# Books being scored right now under the same keys, so concurrent scans of a
+# shelf (e.g. a double-submitted request) share one LLM call per book
+_inflight_scores: dict[tuple[str, str, str], asyncio.Future[dict[str, Any] | None]] = {}
+
+# Raw extraction responses keyed by image digest, plus extractions in flight so
+# concurrent uploads of the same image share one VLM call
+_extraction_cache: TTLCache[bytes, str] = TTLCache(
+    maxsize=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_CACHE_TTL
+)
+_inflight_extractions: dict[bytes, asyncio.Task[str]] = {}
+# Digests of images every provider rejected (e.g. all returned empty responses),
+# so immediate retries don't repeat every provider call. Transient failures
+# aren't recorded, since a retry may well succeed.
+_failed_extractions: TTLCache[bytes, bool] = TTLCache(
+    maxsize=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_FAILURE_TTL
+)
+
+
+@dataclass(slots=True)
+class ProviderStats:
+    """Recent call outcomes of a provider, as exponentially weighted moving averages."""
+
+    success_rate: float = 1.0  # As of the last call; see current_success_rate()
+    latency: float = 0.0  # Seconds
+    calls: int = 0
+    last_call: float = 0.0  # time.monotonic() of the last recorded call
+
+    def current_success_rate(self, now: float | None = None) -> float:
+        """
+        Success rate with failures forgotten over time since the last call.
+
+        A demoted provider is only tried after the healthy ones, so it may get
+        no calls to recover with. Decaying its failure rate while it is idle
+        moves it back in front after a few PROVIDER_RECOVERY_HALF_LIFEs; if it
+        is still failing, the next calls demote it again.
+        """
+        if self.calls == 0:
+            return self.success_rate
+        idle = (time.monotonic() if now is None else now) - self.last_call
+        decay: float = 0.5 ** (idle / PROVIDER_RECOVERY_HALF_LIFE)
+        return 1.0 - (1.0 - self.success_rate) * decay
+
+    def record(self, latency: float, ok: bool) -> None:
+        """Fold one call's outcome into the averages."""
+        now = time.monotonic()
+        if self.calls == 0:
+            self.latency = latency
+        else:
+            self.latency += PROVIDER_STATS_ALPHA * (latency - self.latency)
+        success_rate = self.current_success_rate(now)
+        self.success_rate = success_rate + PROVIDER_STATS_ALPHA * (
+            (1.0 if ok else 0.0) - success_rate
+        )
+        self.calls += 1
+        self.last_call = now
+
+    def score(self) -> float:
+        """Success-weighted inverse latency; higher is better."""
+        return self.current_success_rate() / (1.0 + self.latency)
+
+
+_provider_stats: dict[str, ProviderStats] = {name: ProviderStats() for name in PROVIDER_CLASSES}
+
+
+@cache
+def _provider_class(provider_type: LLMProviderType) -> type[LLMProvider]:
+    """
+    Import a provider's class on first use.
+
+    Args:
+        provider_type: Type of provider
+
+    Returns:
+        LLMProvider subclass
+    """
+    module_name, class_name = PROVIDER_CLASSES[provider_type].split(":")
+    provider_class: type[LLMProvider] = getattr(importlib.import_module(module_name), class_name)
+    return provider_class
+
+
+def _has_api_key(provider_type: LLMProviderType) -> bool:
+    """Check whether a provider's API key is set, without importing its SDK."""
+    return bool(getattr(settings, PROVIDER_API_KEYS[provider_type]))
+
+
+@cache
+def _get_provider(provider_type: LLMProviderType) -> LLMProvider:
+    """
+    Get the shared instance of a provider.
+
+    Providers hold SDK clients with their own connection pools, so one
+    instance per provider type is reused for the life of the process.
+
+    Args:
+        provider_type: Type of provider
+
+    Returns:
+        LLMProvider instance
+    """
+    return _provider_class(provider_type)()
+
+
+def _is_provider_available(provider_type: LLMProviderType) -> bool:
+    """
+    Check whether a provider is configured, caching the result briefly.
+
+    Args:
+        provider_type: Type of provider
+
+    Returns:
+        True if the provider is available
+    """
+    available = _availability_cache.get(provider_type)
+    if available is None:
+        available = _has_api_key(provider_type) and _get_provider(provider_type).is_available()
+        _availability_cache[provider_type] = available
+    return available
+
+
+async def _probe_provider(provider_type: LLMProviderType) -> bool:
+    """
+    Check a provider's availability without blocking the event loop.
+
+    Cached results return immediately; misses run is_available() in a worker
+    thread, bounded by PROVIDER_PROBE_TIMEOUT so one slow provider can't
+    stall the others. Timed-out checks aren't cached and are retried on the
+    next call.
+
+    Args:
+        provider_type: Type of provider
+
+    Returns:
+        True if the provider is available
+    """
+    available = _availability_cache.get(provider_type)
+    if available is not None:
+        return available
+
+    # Unconfigured providers are settled without importing their SDK
+    if not _has_api_key(provider_type):
+        _availability_cache[provider_type] = False
+        return False
+
+    provider = _get_provider(provider_type)
+    try:
+        available = await asyncio.wait_for(
+            asyncio.to_thread(provider.is_available),
+            timeout=PROVIDER_PROBE_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Availability check for {provider_type} timed out")
+        return False
+
+    _availability_cache[provider_type] = available
+    return available
+
 
 def get_llm_provider(provider_type: LLMProviderType | None = None) -> LLMProvider:
     """
@@ -39,10 +251,8 @@ def get_llm_provider(provider_type: LLMProviderType | None = None) -> LLMProvide
     requested_provider = provider_type or settings.LLM_PROVIDER
 
     # Try to create requested provider
-    if requested_provider in PROVIDER_CLASSES:
-        provider = PROVIDER_CLASSES[requested_provider]()
-        if provider.is_available():
-            return provider
+    if requested_provider in PROVIDER_CLASSES and _is_provider_available(requested_provider):
+        return _get_provider(requested_provider)
 
     # Fallback: try providers in order of preference (cheapest first)
     fallback_order: list[LLMProviderType] = ["google", "openai", "anthropic"]
@@ -52,9 +262,8 @@ def get_llm_provider(provider_type: LLMProviderType | None = None) -> LLMProvide
             # Already tried this one
             continue
 
-        provider = PROVIDER_CLASSES[fallback_type]()
-        if provider.is_available():
-            return provider
+        if _is_provider_available(fallback_type):
+            return _get_provider(fallback_type)
 
     # No providers available
     raise RuntimeError(
@@ -63,45 +272,94 @@ def get_llm_provider(provider_type: LLMProviderType | None = None) -> LLMProvide
     )
 
 
-def get_available_providers() -> list[LLMProviderType]:
+async def get_available_providers() -> list[LLMProviderType]:
     """
     Get list of currently available (configured) providers.
 
     Returns:
         List of provider type names that are available
     """
-    available = []
+    names = list(PROVIDER_CLASSES)
 
-    providers = {
-        "openai": OpenAIProvider(),
-        "anthropic": AnthropicProvider(),
-        "google": GoogleProvider(),
-    }
+    # Configuration rarely changes: answer from the cache without scheduling probes
+    cached = [_availability_cache.get(name) for name in names]
+    if None not in cached:
+        return [name for name, available in zip(names, cached, strict=True) if available]
 
-    for name, provider in providers.items():
-        if provider.is_available():
-            available.append(name)  # type: ignore
+    results = await asyncio.gather(*(_probe_provider(name) for name in names))
+    return [name for name, available in zip(names, results, strict=True) if available]
 
-    return available
 
+def reset_provider_caches() -> None:
+    """Forget cached provider instances and availability (e.g. after changing settings in tests)."""
+    _availability_cache.clear()
+    _failed_extractions.clear()
+    _get_provider.cache_clear()
+    _fallback_order.cache_clear()
+    for name in PROVIDER_CLASSES:
+        _provider_stats[name] = ProviderStats()
 
-async def extract_titles_with_fallback(image_bytes: bytes) -> str:
+
+def get_provider_stats() -> dict[str, dict[str, Any]]:
     """
-    Extract titles from image with automatic provider fallback.
+    Get recent success rate and latency of each provider.
 
-    Tries primary provider first, then falls back to other configured providers
-    if the primary one fails.
+    Returns:
+        Mapping of provider name -> stats with keys: success_rate, latency, calls
+    """
+    return {
+        name: {
+            "success_rate": stats.current_success_rate(),
+            "latency": stats.latency,
+            "calls": stats.calls,
+        }
+        for name, stats in _provider_stats.items()
+    }
+
+
+async def aclose_providers() -> None:
+    """Close provider HTTP connections and drop cached instances (called on shutdown)."""
+    await close_shared_http_client()
+    reset_provider_caches()
+
+
+@lru_cache(maxsize=16)
+def _fallback_order(
+    primary_provider: LLMProviderType, available: tuple[LLMProviderType, ...]
+) -> tuple[LLMProviderType, ...]:
+    """
+    Order available providers for a fallback chain: primary first, then the others.
 
     Args:
-        image_bytes: Raw image bytes
+        primary_provider: Preferred provider (settings.LLM_PROVIDER)
+        available: Currently available providers
 
     Returns:
-        Raw JSON string response from successful provider
+        Providers to try, in order
+    """
+    if primary_provider not in available:
+        return available
+    return (primary_provider, *(p for p in available if p != primary_provider))
+
+
+async def _ordered_providers() -> tuple[LLMProviderType, ...]:
+    """
+    Order available providers by preference, demoting recently failing ones.
+
+    Healthy providers keep the configured order (primary first). Providers
+    whose recent success rate dropped below PROVIDER_HEALTHY_SUCCESS_RATE
+    come after them, best score first, so traffic moves away from a provider
+    during an outage without waiting for it to fail on every request. Failures
+    fade while a provider is idle, so a demoted provider is tried first again
+    once its outage is likely over.
+
+    Returns:
+        Providers to try, in order
 
     Raises:
-        RuntimeError: If all providers fail
+        RuntimeError: If no providers are configured
     """
-    available = get_available_providers()
+    available = await get_available_providers()
 
     if not available:
         raise RuntimeError(
@@ -109,99 +367,357 @@ async def extract_titles_with_fallback(image_bytes: bytes) -> str:
             "OPENAI_API_KEY, ANTHROPIC_API_KEY, or GOOGLE_API_KEY"
         )
 
+    preferred = _fallback_order(settings.LLM_PROVIDER, tuple(available))
+    healthy = [
+        p for p in preferred
+        if _provider_stats[p].current_success_rate() >= PROVIDER_HEALTHY_SUCCESS_RATE
+    ]
+    if len(healthy) == len(preferred):
+        return preferred
+
+    degraded = sorted(
+        (p for p in preferred if p not in healthy),
+        key=lambda p: _provider_stats[p].score(),
+        reverse=True,
+    )
+    return (*healthy, *degraded)
 
-    # Try providers in order: primary first, then others
-    primary_provider = settings.LLM_PROVIDER
-    providers_to_try = [primary_provider] + [p for p in available if p != primary_provider]
 
-    errors = []
+async def _run_with_fallback(
+    providers_to_try: tuple[LLMProviderType, ...],
+    attempt: Callable[[LLMProvider], Awaitable[T]],
+    task_name: str,
+    timeouts: dict[str, float],
+) -> T:
+    """
+    Run a provider call, falling back to the next provider on failure.
 
-    for provider_name in providers_to_try:
-        if provider_name not in available:
-            continue
+    By default providers are tried one after another. When
+    settings.LLM_HEDGE_DELAY_MS is set, the next provider is also started
+    whenever the running ones haven't answered within that delay; the first
+    success wins and the other calls are cancelled.
 
-        try:
-            provider = PROVIDER_CLASSES[provider_name]()
-            logger.info(f"Attempting VLM extraction with {provider_name}")
+    Args:
+        providers_to_try: Providers in order of preference
+        attempt: Coroutine function making the call on a provider
+        task_name: Description of the call for logs and errors
+        timeouts: Deadline in seconds for each provider's call
 
-            result = await provider.extract_titles_from_image(image_bytes)
+    Returns:
+        Result of the first successful provider
 
-            logger.info(f"✅ VLM extraction succeeded with {provider_name}")
-            return result
+    Raises:
+        RuntimeError: If all providers fail
+    """
+    errors: list[str] = []
 
+    async def run(provider_name: LLMProviderType) -> T:
+        logger.info(f"Attempting {task_name} with {provider_name}")
+        timeout = timeouts[provider_name]
+        stats = _provider_stats[provider_name]
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                attempt(_get_provider(provider_name)), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            stats.record(time.perf_counter() - started, ok=False)
+            errors.append(f"{provider_name}: timed out after {timeout}s")
+            logger.warning(f"❌ {task_name} timed out with {provider_name} after {timeout}s")
+            raise
         except Exception as e:
-            error_msg = f"{provider_name}: {str(e)}"
-            errors.append(error_msg)
-            logger.warning(f"❌ VLM extraction failed with {provider_name}: {e}")
-
-            # Continue to next provider
-            continue
+            stats.record(time.perf_counter() - started, ok=False)
+            errors.append(f"{provider_name}: {str(e)}")
+            logger.warning(f"❌ {task_name} failed with {provider_name}: {e}")
+            raise
+        stats.record(time.perf_counter() - started, ok=True)
+        logger.info(f"✅ {task_name} succeeded with {provider_name}")
+        return result
+
+    hedge_delay = settings.LLM_HEDGE_DELAY_MS / 1000
+
+    if hedge_delay <= 0:
+        for provider_name in providers_to_try:
+            try:
+                return await run(provider_name)
+            except Exception:
+                # Continue to next provider
+                continue
+    else:
+        queue = list(providers_to_try)
+        pending: set[asyncio.Task[T]] = set()
+        try:
+            while queue or pending:
+                # Start the next provider: first call, hedge delay elapsed, or a failure
+                if queue:
+                    pending.add(asyncio.create_task(run(queue.pop(0))))
+
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=hedge_delay if queue else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     # All providers failed
-    raise RuntimeError(
-        f"All VLM providers failed. Errors: {'; '.join(errors)}"
-    )
+    raise RuntimeError(f"All {task_name} providers failed. Errors: {'; '.join(errors)}")
 
 
-async def calculate_batch_scores_with_fallback(
-    detected_books: list[dict],
-    user_library: list[dict]
-) -> list[dict]:
+async def extract_titles_with_fallback(image_bytes: bytes) -> str:
     """
-    Calculate batch match scores with automatic provider fallback.
+    Extract titles from image with automatic provider fallback.
 
     Tries primary provider first, then falls back to other configured providers
-    if the primary one fails.
+    if the primary one fails. Identical images uploaded concurrently share one
+    extraction, and well-formed results are reused for a few minutes. An image
+    that every provider just rejected fails immediately for a short while.
 
     Args:
-        detected_books: List of book metadata to evaluate
-        user_library: User's library books
+        image_bytes: Raw image bytes
 
     Returns:
-        List of dicts with keys: title, score, explanation
+        Raw JSON string response from successful provider
 
     Raises:
+        ValueError: If every provider rejected the image
         RuntimeError: If all providers fail
     """
-    available = get_available_providers()
+    key = hashlib.blake2b(image_bytes, digest_size=16).digest()
 
-    if not available:
-        raise RuntimeError(
-            "No LLM providers are configured. Please set at least one API key: "
-            "OPENAI_API_KEY, ANTHROPIC_API_KEY, or GOOGLE_API_KEY"
-        )
+    cached = _extraction_cache.get(key)
+    if cached is not None:
+        logger.info("VLM extraction served from cache")
+        return cached
 
+    if key in _failed_extractions:
+        raise RuntimeError("VLM extraction recently failed for this image; not retrying yet")
 
-    # Try providers in order: primary first, then others
-    primary_provider = settings.LLM_PROVIDER
-    providers_to_try = [primary_provider] + [p for p in available if p != primary_provider]
+    task = _inflight_extractions.get(key)
+    if task is None:
+        task = asyncio.create_task(_extract_titles(image_bytes))
+        _inflight_extractions[key] = task
 
-    errors = []
+        def finish(done: asyncio.Task[str]) -> None:
+            _inflight_extractions.pop(key, None)
+            if done.cancelled():
+                return
+            if done.exception() is None:
+                # Malformed output isn't cached, so a re-upload gets a fresh try
+                if _is_title_list(done.result()):
+                    _extraction_cache[key] = done.result()
+            elif isinstance(done.exception(), ValueError):
+                _failed_extractions[key] = True
 
-    for provider_name in providers_to_try:
-        if provider_name not in available:
-            continue
+        task.add_done_callback(finish)
+    else:
+        logger.info("Joining in-flight VLM extraction for identical image")
 
-        try:
-            provider = PROVIDER_CLASSES[provider_name]()
-            logger.info(f"Attempting batch recommendation scoring with {provider_name}")
+    # Shielded so one cancelled request doesn't cancel the others' shared call
+    return await asyncio.shield(task)
 
-            results = await provider.calculate_batch_match_scores(
-                detected_books, user_library
-            )
 
-            logger.info(f"✅ Batch recommendation scoring succeeded with {provider_name}")
-            return results
+def _is_title_list(raw_response: str) -> bool:
+    """Check that an extraction response parses as the JSON list of titles asked for."""
+    try:
+        return isinstance(orjson.loads(strip_markdown_fence(raw_response)), list)
+    except orjson.JSONDecodeError:
+        return False
+
+
+def _is_rejection(error: BaseException) -> bool:
+    """
+    Check whether a provider failed on the image itself rather than transiently.
+
+    Empty or invalid responses surface as ValueError and refused requests as a
+    REJECTED_IMAGE_STATUSES status, possibly wrapped in the provider's
+    RuntimeError, so the cause chain is searched.
+    """
+    cause: BaseException | None = error
+    while cause is not None:
+        status = getattr(cause, "status_code", None) or getattr(cause, "code", None)
+        if isinstance(cause, ValueError) or status in REJECTED_IMAGE_STATUSES:
+            return True
+        cause = cause.__cause__
+    return False
+
+
+async def _extract_titles(image_bytes: bytes) -> str:
+    """
+    Run title extraction across providers (see extract_titles_with_fallback).
+
+    Args:
+        image_bytes: Raw image bytes
+
+    Returns:
+        Raw JSON string response from successful provider
+
+    Raises:
+        ValueError: If every provider rejected the image
+        RuntimeError: If all providers fail
+    """
+    # Try providers in order: primary first, then others, recently failing ones last
+    providers_to_try = await _ordered_providers()
 
+    # Shrink large photos once, so every provider attempt uploads the small copy
+    image_bytes = await asyncio.to_thread(prepare_vision_image, image_bytes)
+
+    rejections = 0
+
+    async def extract(provider: LLMProvider) -> str:
+        nonlocal rejections
+        try:
+            return await provider.extract_titles_from_image(image_bytes)
         except Exception as e:
-            error_msg = f"{provider_name}: {str(e)}"
-            errors.append(error_msg)
-            logger.warning(f"❌ Batch recommendation scoring failed with {provider_name}: {e}")
+            rejections += _is_rejection(e)
+            raise
 
-            # Continue to next provider
-            continue
+    try:
+        return await _run_with_fallback(
+            providers_to_try, extract, "VLM extraction", VLM_PROVIDER_TIMEOUTS
+        )
+    except RuntimeError as e:
+        # Timeouts and other failures may pass on a retry; only an image
+        # every provider rejected is worth failing fast on
+        if providers_to_try and rejections == len(providers_to_try):
+            raise ValueError(f"Every VLM provider rejected the image: {e}") from e
+        raise
 
-    # All providers failed
-    raise RuntimeError(
-        f"All batch recommendation providers failed. Errors: {'; '.join(errors)}"
-    )
+
+def _score_cache_key(fingerprint: str, title: str, author: str) -> tuple[str, str, str]:
+    """Build the score cache key for a book scored against a library."""
+    return (fingerprint, normalize_text(title), normalize_text(author))
+
+
+def _match_scores_to_books(
+    books: list[dict[str, Any]], scores: list[dict[str, Any]]
+) -> list[dict[str, Any] | None]:
+    """
+    Pair batch scoring results with the books they were requested for.
+
+    The prompt asks for one result per book, in order, so a result is taken
+    positionally when its title matches that book's. Other results go to the
+    first unmatched book with the same normalized title. Books sharing a title
+    stay apart, and echoed titles may differ in case or punctuation or come
+    back reordered.
+
+    Args:
+        books: Books sent to the LLM, in prompt order
+        scores: Parsed results with keys: title, score, explanation
+
+    Returns:
+        One result per book, in book order; None for books without a result
+    """
+    titles = [normalize_text(book.get("title") or "") for book in books]
+    matched: list[dict[str, Any] | None] = [None] * len(books)
+    leftovers = []
+    for i, score in enumerate(scores):
+        title = normalize_text(score.get("title") or "")
+        if i < len(books) and titles[i] == title:
+            matched[i] = score
+        else:
+            leftovers.append((title, score))
+
+    unmatched: dict[str, deque[int]] = defaultdict(deque)
+    for i, title in enumerate(titles):
+        if matched[i] is None:
+            unmatched[title].append(i)
+    for title, score in leftovers:
+        if unmatched[title]:
+            matched[unmatched[title].popleft()] = score
+    return matched
+
+
+async def calculate_batch_scores_with_fallback(
+    detected_books: list[dict[str, Any]],
+    user_library: list[dict[str, Any]],
+    user_id: str | None = None,
+) -> list[dict[str, Any] | None]:
+    """
+    Calculate batch match scores with automatic provider fallback.
+
+    Tries primary provider first, then falls back to other configured providers
+    if the primary one fails. Books scored recently against the same library,
+    or being scored by a concurrent request, aren't sent to the LLM again.
+
+    Args:
+        detected_books: List of book metadata to evaluate
+        user_library: User's library books
+        user_id: Owner of the library, used to cache its prompt section
+
+    Returns:
+        One dict with keys title, score, explanation per detected book, in the
+        same order; None for books no provider returned a score for
+
+    Raises:
+        RuntimeError: If all providers fail
+    """
+    # Reuse recent scores against the same library, and join books another
+    # request (or an earlier copy in this scan) is scoring right now
+    fingerprint = library_fingerprint(user_library)
+    results: list[dict[str, Any] | None] = [None] * len(detected_books)
+    joined: list[tuple[int, asyncio.Future[dict[str, Any] | None]]] = []
+    to_score: list[tuple[int, tuple[str, str, str]]] = []
+    owned: dict[tuple[str, str, str], asyncio.Future[dict[str, Any] | None]] = {}
+    for i, book in enumerate(detected_books):
+        key = _score_cache_key(fingerprint, book.get("title") or "", book.get("author") or "")
+        cached = _batch_score_cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        elif key in _inflight_scores:
+            joined.append((i, _inflight_scores[key]))
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _inflight_scores[key] = owned[key] = future
+            to_score.append((i, key))
+
+    cached_count = len(detected_books) - len(joined) - len(to_score)
+    if not to_score and not joined:
+        logger.info("Batch recommendation scores served from cache")
+    elif cached_count or joined:
+        logger.info(
+            f"Reusing {cached_count} cached and {len(joined)} in-flight scores "
+            f"for {len(detected_books)} books"
+        )
+
+    if to_score:
+        books_to_score = [detected_books[i] for i, _ in to_score]
+        fresh_results: list[dict[str, Any]] = []
+        try:
+            # Try providers in order: primary first, then others, recently failing ones last
+            providers_to_try = await _ordered_providers()
+
+            async def score(provider: LLMProvider) -> list[dict[str, Any]]:
+                return await provider.score_detected_books(books_to_score, user_library, user_id)
+
+            fresh_results = await _run_with_fallback(
+                providers_to_try, score, "batch recommendation scoring", BATCH_SCORING_TIMEOUTS
+            )
+        finally:
+            # Hand results to joined requests; books that weren't returned (or
+            # a failed call) resolve to None, so those requests fall back per book
+            matched = _match_scores_to_books(books_to_score, fresh_results)
+            for (i, key), result in zip(to_score, matched, strict=True):
+                if result is not None:
+                    results[i] = _batch_score_cache[key] = result
+                future = owned[key]
+                if not future.done():
+                    future.set_result(result)
+                if _inflight_scores.get(key) is future:
+                    del _inflight_scores[key]
+
+    for i, future in joined:
+        # Shielded so this request being cancelled doesn't cancel the shared future
+        results[i] = await asyncio.shield(future)
+
+    # Report each score under this scan's title, which may differ in case or
+    # punctuation from the one the LLM echoed or the score was cached under
+    return [
+        None if result is None else {**result, "title": book.get("title") or ""}
+        for book, result in zip(detected_books, results, strict=True)
+    ]
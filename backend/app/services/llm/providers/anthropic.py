@@ -1,18 +1,26 @@
 """Anthropic Claude provider for LLM-based recommendations."""
 
 import base64
-import json
 from typing import Any
 
+import orjson
 from anthropic import AsyncAnthropic
 
 from app.core.config import settings
-from app.services.llm.base import LLMProvider
+from app.services.llm.base import (
+    BATCH_SYSTEM_PROMPT,
+    VISION_PROMPT,
+    LLMProvider,
+    detect_image_media_type,
+    get_shared_http_client,
+)
 
 
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude provider for book recommendations."""
 
+    max_concurrent_scoring_calls = 5  # Keeps bursts inside Anthropic's lower RPM tiers
+
     def __init__(self, model: str = "claude-3-5-haiku-20241022") -> None:
         """
         Initialize Anthropic provider.
@@ -22,7 +30,9 @@ class AnthropicProvider(LLMProvider):
         """
         self.model = model
         self.client = (
-            AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+            AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY, http_client=get_shared_http_client()
+            )
             if settings.ANTHROPIC_API_KEY
             else None
         )
@@ -46,47 +56,10 @@ class AnthropicProvider(LLMProvider):
 
         try:
             # Encode image to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            base64_image = base64.b64encode(image_bytes).decode("ascii")
 
             # Detect image type (default to jpeg if unsure)
-            image_media_type = "image/jpeg"
-            if image_bytes.startswith(b'\x89PNG'):
-                image_media_type = "image/png"
-            elif image_bytes.startswith(b'GIF'):
-                image_media_type = "image/gif"
-            elif image_bytes.startswith(b'WEBP'):
-                image_media_type = "image/webp"
-
-            # Create vision prompt
-            prompt = """Analyze this image of a bookshelf or book covers and extract all visible book titles with author names.
-
-For each book you can clearly identify, provide:
-1. title: The full book title (as accurately as you can read it)
-2. author: The author's name if visible on the cover/spine (null if not visible or unclear)
-3. confidence: Score from 0.0 to 1.0 based on how clearly you can read the title
-
-Rules:
-- Only include actual book titles you can see in the image
-- Extract author names separately in the "author" field - DO NOT include them in the title
-- If you can only partially read a title, include what you can see and lower the confidence
-- If text is blurry or unclear, give it a lower confidence score (0.3-0.6)
-- If text is crystal clear, give it a high confidence score (0.8-1.0)
-- Ignore ISBN numbers, prices, barcodes, or other metadata
-- Include both horizontal and vertical text (book spines)
-
-CRITICAL: Return ONLY valid JSON - no markdown formatting, no code blocks, no extra text.
-Your entire response must be ONLY the JSON array below:
-[{
-  "title": "The Hobbit",
-  "author": "J.R.R. Tolkien",
-  "confidence": 0.95
-}, {
-  "title": "1984",
-  "author": "George Orwell",
-  "confidence": 0.85
-}]
-
-If you cannot identify any book titles with reasonable confidence, return an empty array: []"""
+            image_media_type = detect_image_media_type(image_bytes)
 
             response = await self.client.messages.create(
                 model=self.model,
@@ -106,7 +79,7 @@ If you cannot identify any book titles with reasonable confidence, return an emp
                             },
                             {
                                 "type": "text",
-                                "text": prompt
+                                "text": VISION_PROMPT
                             }
                         ],
                     }
@@ -117,15 +90,60 @@ If you cannot identify any book titles with reasonable confidence, return an emp
             if not content:
                 raise ValueError("Empty response from Claude Vision")
 
-            return content.strip()
+            # Whitespace and code fences are stripped by the caller's parser
+            return content
 
         except Exception as e:
             raise RuntimeError(f"Claude Vision API error: {e}") from e
 
+    def _scoring_request_params(
+        self,
+        detected_books: list[dict[str, Any]],
+        user_library: list[dict[str, Any]],
+        user_id: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Build the Messages API parameters for a scoring request.
+
+        The cache breakpoint after the library section lets repeat scans of
+        the same library reuse the cached system prompt and library tokens.
+
+        Args:
+            detected_books: List of book metadata to evaluate
+            user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
+
+        Returns:
+            Messages API request parameters
+        """
+        library_section, books_section = self._build_batch_user_prompt(
+            detected_books, user_library, user_id
+        )
+        return {
+            "model": self.model,
+            "max_tokens": 2000,  # More tokens for multiple books
+            "temperature": 0.3,
+            "system": BATCH_SYSTEM_PROMPT,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": library_section,
+                            "cache_control": {"type": "ephemeral"},
+                        },
+                        {"type": "text", "text": books_section},
+                    ],
+                }
+            ],
+        }
+
     async def calculate_batch_match_scores(
         self,
         detected_books: list[dict[str, Any]],
         user_library: list[dict[str, Any]],
+        user_id: str | None = None,
     ) -> list[dict[str, Any]]:
         """
         Calculate match scores for multiple books in a single API call.
@@ -133,6 +151,7 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         Args:
             detected_books: List of book metadata to evaluate
             user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
 
         Returns:
             List of dicts with keys: title, score, explanation
@@ -143,53 +162,18 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         if not detected_books:
             return []
 
-        prompt = self._build_batch_recommendation_prompt(detected_books, user_library)
-
         try:
             response = await self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,  # More tokens for multiple books
-                temperature=0.3,
-                messages=[{"role": "user", "content": prompt}],
+                **self._scoring_request_params(detected_books, user_library, user_id)
             )
 
             content = response.content[0].text if response.content else ""
             if not content:
                 raise ValueError("Empty response from Anthropic")
 
-            # Clean markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-
-            # Parse JSON response
-            results = json.loads(content)
-
-            if not isinstance(results, list):
-                raise ValueError("Expected JSON array response")
-
-            # Extract scores and explanations with title for safe matching
-            parsed_results = []
-            for result in results:
-                title = result.get("title", "")
-                score = float(result.get("score", 0.0))
-                explanation = result.get("explanation", "No explanation provided")
-                # Clamp score to valid range
-                score = max(0.0, min(1.0, score))
-                parsed_results.append({
-                    "title": title,
-                    "score": score,
-                    "explanation": explanation
-                })
-
-            return parsed_results
-
-        except json.JSONDecodeError as e:
+            return self._parse_match_scores(content)
+
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON response from Anthropic: {e}") from e
         except Exception as e:
             raise RuntimeError(f"Anthropic batch API error: {e}") from e
@@ -1,20 +1,56 @@
 """Google Gemini provider for LLM-based recommendations."""
 
 import base64
-import json
 from typing import Any
 
 import google.generativeai as genai
+import orjson
+from google.api_core import exceptions as google_exceptions
+from google.api_core.retry import if_exception_type
+from google.api_core.retry_async import AsyncRetry
+from google.generativeai.types.helper_types import RequestOptionsType
 from PIL import Image
 import io
 
 from app.core.config import settings
-from app.services.llm.base import LLMProvider
+from app.services.llm.base import (
+    BATCH_SYSTEM_PROMPT,
+    VISION_PROMPT,
+    LLMProvider,
+    detect_image_media_type,
+)
+
+# Image types Gemini accepts as raw bytes; anything else is converted with PIL
+GEMINI_IMAGE_TYPES = frozenset(
+    {"image/png", "image/jpeg", "image/webp", "image/heic", "image/heif"}
+)
+# Longest side of images converted with PIL; Gemini downsamples larger ones anyway
+GEMINI_MAX_IMAGE_SIDE = 1536
+
+# Retry transient Gemini errors (rate limits, overload, 5xx) with jittered
+# exponential backoff, like the OpenAI and Anthropic SDKs do by default.
+# Bounded to stay inside the factory's per-provider deadlines.
+GEMINI_RETRY = AsyncRetry(
+    predicate=if_exception_type(
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+    ),
+    initial=0.5,
+    maximum=8.0,
+    multiplier=2.0,
+    timeout=15.0,
+)
+# The SDK's RequestOptions is typed for the sync Retry, but the async client
+# these calls go through needs an AsyncRetry
+GEMINI_REQUEST_OPTIONS: RequestOptionsType = {"retry": GEMINI_RETRY}  # type: ignore[typeddict-item]
 
 
 class GoogleProvider(LLMProvider):
     """Google Gemini provider for book recommendations."""
 
+    max_concurrent_scoring_calls = 4  # Gemini free and low paid tiers return 429 on larger bursts
+
     def __init__(self, model: str = "gemini-2.0-flash-exp") -> None:
         """
         Initialize Google Gemini provider.
@@ -24,6 +60,7 @@ class GoogleProvider(LLMProvider):
         """
         self.model_name = model
         self.model = None
+        self.batch_model = None
 
         if settings.GOOGLE_API_KEY:
             genai.configure(api_key=settings.GOOGLE_API_KEY)
@@ -32,7 +69,20 @@ class GoogleProvider(LLMProvider):
                 generation_config={
                     "temperature": 0.3,
                     "max_output_tokens": 2000,  # Support ~30 books (~65 tokens/book)
+                    # JSON mode: no markdown fences or prose around the array
+                    "response_mime_type": "application/json",
+                },
+            )
+            # Scoring model carries the static instructions as its system
+            # instruction, keeping them a fixed prefix for implicit caching
+            self.batch_model = genai.GenerativeModel(
+                model_name=self.model_name,
+                generation_config={
+                    "temperature": 0.3,
+                    "max_output_tokens": 2000,  # More tokens for multiple books
+                    "response_mime_type": "application/json",
                 },
+                system_instruction=BATCH_SYSTEM_PROMPT,
             )
 
     def is_available(self) -> bool:
@@ -53,48 +103,31 @@ class GoogleProvider(LLMProvider):
             raise RuntimeError("Google Gemini client not initialized. Check API key.")
 
         try:
-            # Load image from bytes
-            image = Image.open(io.BytesIO(image_bytes))
-
-            # Create vision prompt
-            prompt = """Analyze this image of a bookshelf or book covers and extract all visible book titles with author names.
-
-For each book you can clearly identify, provide:
-1. title: The full book title (as accurately as you can read it)
-2. author: The author's name if visible on the cover/spine (null if not visible or unclear)
-3. confidence: Score from 0.0 to 1.0 based on how clearly you can read the title
-
-Rules:
-- Only include actual book titles you can see in the image
-- Extract author names separately in the "author" field - DO NOT include them in the title
-- If you can only partially read a title, include what you can see and lower the confidence
-- If text is blurry or unclear, give it a lower confidence score (0.3-0.6)
-- If text is crystal clear, give it a high confidence score (0.8-1.0)
-- Ignore ISBN numbers, prices, barcodes, or other metadata
-- Include both horizontal and vertical text (book spines)
-
-CRITICAL: Return ONLY valid JSON - no markdown formatting, no code blocks, no extra text.
-Your entire response must be ONLY the JSON array below:
-[{
-  "title": "The Hobbit",
-  "author": "J.R.R. Tolkien",
-  "confidence": 0.95
-}, {
-  "title": "1984",
-  "author": "George Orwell",
-  "confidence": 0.85
-}]
-
-If you cannot identify any book titles with reasonable confidence, return an empty array: []"""
+            # Send supported formats as-is instead of decoding them with PIL
+            # only for the SDK to re-encode them
+            media_type = detect_image_media_type(image_bytes, default=None)
+            image: dict[str, Any] | Image.Image
+            if media_type in GEMINI_IMAGE_TYPES:
+                image = {"mime_type": media_type, "data": image_bytes}
+            else:
+                # Shrink before the SDK re-encodes it, so large photos don't
+                # cost a full-resolution encode and upload
+                photo = Image.open(io.BytesIO(image_bytes))
+                photo.draft("RGB", (GEMINI_MAX_IMAGE_SIDE, GEMINI_MAX_IMAGE_SIDE))
+                photo.thumbnail((GEMINI_MAX_IMAGE_SIDE, GEMINI_MAX_IMAGE_SIDE))
+                image = photo
 
             # Generate content with vision
-            response = await self.model.generate_content_async([prompt, image])
-            content = response.text if response.text else ""
+            response = await self.model.generate_content_async(
+                [VISION_PROMPT, image], request_options=GEMINI_REQUEST_OPTIONS
+            )
+            content = response.text or ""
 
             if not content:
                 raise ValueError("Empty response from Google Gemini Vision")
 
-            return content.strip()
+            # Whitespace and code fences are stripped by the caller's parser
+            return content
 
         except Exception as e:
             raise RuntimeError(f"Google Gemini Vision API error: {e}") from e
@@ -103,6 +136,7 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         self,
         detected_books: list[dict[str, Any]],
         user_library: list[dict[str, Any]],
+        user_id: str | None = None,
     ) -> list[dict[str, Any]]:
         """
         Calculate match scores for multiple books in a single API call.
@@ -110,67 +144,33 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         Args:
             detected_books: List of book metadata to evaluate
             user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
 
         Returns:
             List of dicts with keys: title, score, explanation
         """
-        if not self.model:
+        if not self.batch_model:
             raise RuntimeError("Google Gemini client not initialized. Check API key.")
 
         if not detected_books:
             return []
 
-        prompt = self._build_batch_recommendation_prompt(detected_books, user_library)
+        library_section, books_section = self._build_batch_user_prompt(
+            detected_books, user_library, user_id
+        )
 
         try:
-            # Use higher max_output_tokens for batch processing
-            batch_model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config={
-                    "temperature": 0.3,
-                    "max_output_tokens": 2000,  # More tokens for multiple books
-                },
+            response = await self.batch_model.generate_content_async(
+                library_section + books_section, request_options=GEMINI_REQUEST_OPTIONS
             )
 
-            response = await batch_model.generate_content_async(prompt)
-
-            content = response.text if response.text else ""
+            content = response.text or ""
             if not content:
                 raise ValueError("Empty response from Google Gemini")
 
-            # Clean markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-
-            # Parse JSON response
-            results = json.loads(content)
-
-            if not isinstance(results, list):
-                raise ValueError("Expected JSON array response")
-
-            # Extract scores and explanations with title for safe matching
-            parsed_results = []
-            for result in results:
-                title = result.get("title", "")
-                score = float(result.get("score", 0.0))
-                explanation = result.get("explanation", "No explanation provided")
-                # Clamp score to valid range
-                score = max(0.0, min(1.0, score))
-                parsed_results.append({
-                    "title": title,
-                    "score": score,
-                    "explanation": explanation
-                })
-
-            return parsed_results
-
-        except json.JSONDecodeError as e:
+            return self._parse_match_scores(content)
+
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON response from Google Gemini: {e}") from e
         except Exception as e:
             raise RuntimeError(f"Google Gemini batch API error: {e}") from e
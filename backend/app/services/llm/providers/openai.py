@@ -1,13 +1,70 @@
 """OpenAI provider for LLM-based recommendations."""
 
 import base64
-import json
+import logging
+import re
+import time
 from typing import Any
 
+import httpx
+import orjson
 from openai import AsyncOpenAI
 
 from app.core.config import settings
-from app.services.llm.base import LLMProvider
+from app.services.llm.base import (
+    BATCH_SYSTEM_PROMPT,
+    VISION_PROMPT,
+    LLMProvider,
+    detect_image_media_type,
+    get_shared_http_client,
+)
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_MIN_REQUESTS = 2  # Pause scoring when this few requests remain in the window
+RATE_LIMIT_MIN_TOKENS = 8000  # ...or fewer tokens than about one scoring call uses
+RATE_LIMIT_MAX_PAUSE = 5.0  # Seconds; longer resets are left to the 429 backoff
+# Components of OpenAI's reset durations, e.g. "1s", "6m0s", "20ms"
+RESET_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+RESET_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Structured output schema for scoring responses: the {"results": [...]} object
+# BATCH_SYSTEM_PROMPT asks every provider for.
+MATCH_SCORES_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "book_match_scores",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string"},
+                            "score": {"type": "number"},
+                            "explanation": {"type": "string"},
+                        },
+                        "required": ["title", "score", "explanation"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def parse_reset_duration(value: str) -> float:
+    """Convert an x-ratelimit-reset-* header value to seconds."""
+    return sum(
+        float(amount) * RESET_UNIT_SECONDS[unit]
+        for amount, unit in RESET_DURATION_RE.findall(value)
+    )
 
 
 class OpenAIProvider(LLMProvider):
@@ -21,7 +78,14 @@ class OpenAIProvider(LLMProvider):
             model: OpenAI model to use (default: gpt-4o-mini for cost efficiency)
         """
         self.model = model
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+        self.client = (
+            AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=get_shared_http_client())
+            if settings.OPENAI_API_KEY
+            else None
+        )
+        # Monotonic time before which new scoring calls wait, set when the
+        # rate-limit headers show the window is almost used up
+        self._paused_until = 0.0
 
     def is_available(self) -> bool:
         """Check if OpenAI is configured."""
@@ -42,38 +106,8 @@ class OpenAIProvider(LLMProvider):
 
         try:
             # Encode image to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-
-            # Create vision prompt
-            prompt = """Analyze this image of a bookshelf or book covers and extract all visible book titles with author names.
-
-For each book you can clearly identify, provide:
-1. title: The full book title (as accurately as you can read it)
-2. author: The author's name if visible on the cover/spine (null if not visible or unclear)
-3. confidence: Score from 0.0 to 1.0 based on how clearly you can read the title
-
-Rules:
-- Only include actual book titles you can see in the image
-- Extract author names separately in the "author" field - DO NOT include them in the title
-- If you can only partially read a title, include what you can see and lower the confidence
-- If text is blurry or unclear, give it a lower confidence score (0.3-0.6)
-- If text is crystal clear, give it a high confidence score (0.8-1.0)
-- Ignore ISBN numbers, prices, barcodes, or other metadata
-- Include both horizontal and vertical text (book spines)
-
-CRITICAL: Return ONLY valid JSON - no markdown formatting, no code blocks, no extra text.
-Your entire response must be ONLY the JSON array below:
-[{
-  "title": "The Hobbit",
-  "author": "J.R.R. Tolkien",
-  "confidence": 0.95
-}, {
-  "title": "1984",
-  "author": "George Orwell",
-  "confidence": 0.85
-}]
-
-If you cannot identify any book titles with reasonable confidence, return an empty array: []"""
+            base64_image = base64.b64encode(image_bytes).decode("ascii")
+            image_media_type = detect_image_media_type(image_bytes)
 
             response = await self.client.chat.completions.create(
                 model="gpt-4o-mini",  # Use vision-capable model
@@ -81,11 +115,11 @@ If you cannot identify any book titles with reasonable confidence, return an emp
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": prompt},
+                            {"type": "text", "text": VISION_PROMPT},
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
+                                    "url": f"data:{image_media_type};base64,{base64_image}",
                                     "detail": "high"  # High detail for better text recognition
                                 }
                             }
@@ -100,15 +134,85 @@ If you cannot identify any book titles with reasonable confidence, return an emp
             if not content:
                 raise ValueError("Empty response from OpenAI Vision")
 
-            return content.strip()
+            # Whitespace and code fences are stripped by the caller's parser
+            return content
 
         except Exception as e:
             raise RuntimeError(f"OpenAI Vision API error: {e}") from e
 
+    def _track_rate_limit(self, headers: httpx.Headers) -> None:
+        """
+        Pause further scoring calls if the rate-limit window is nearly used up.
+
+        Reading x-ratelimit-* headers lets calls wait for the window to reset
+        instead of running into 429 errors.
+
+        Args:
+            headers: Response headers of a chat completion
+        """
+        reset = 0.0
+        try:
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests and int(remaining_requests) <= RATE_LIMIT_MIN_REQUESTS:
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests", ""))
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens and int(remaining_tokens) < RATE_LIMIT_MIN_TOKENS:
+                reset = max(
+                    reset, parse_reset_duration(headers.get("x-ratelimit-reset-tokens", ""))
+                )
+        except ValueError:
+            return  # Unexpected header format; rely on 429 handling instead
+
+        if reset > 0:
+            logger.warning(f"OpenAI rate limit nearly exhausted, pausing scoring for {reset:.1f}s")
+            self._paused_until = max(
+                self._paused_until, time.monotonic() + min(reset, RATE_LIMIT_MAX_PAUSE)
+            )
+
+    def rate_limit_pause(self) -> float:
+        """Seconds left of a pause set by _track_rate_limit."""
+        return self._paused_until - time.monotonic()
+
+    def _scoring_request_body(
+        self,
+        detected_books: list[dict[str, Any]],
+        user_library: list[dict[str, Any]],
+        user_id: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        Build the chat completion parameters for a scoring request.
+
+        The static system prompt and library section lead the request, so
+        repeat calls hit OpenAI's automatic prompt cache.
+
+        Args:
+            detected_books: List of book metadata to evaluate
+            user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
+
+        Returns:
+            Chat completion request parameters
+        """
+        library_section, books_section = self._build_batch_user_prompt(
+            detected_books, user_library, user_id
+        )
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": library_section + books_section},
+            ],
+            "temperature": 0.3,
+            "max_tokens": 2000,  # More tokens for multiple books
+            # Guarantees parseable JSON with every field present
+            "response_format": MATCH_SCORES_RESPONSE_FORMAT,
+        }
+
     async def calculate_batch_match_scores(
         self,
         detected_books: list[dict[str, Any]],
         user_library: list[dict[str, Any]],
+        user_id: str | None = None,
     ) -> list[dict[str, Any]]:
         """
         Calculate match scores for multiple books in a single API call.
@@ -116,6 +220,7 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         Args:
             detected_books: List of book metadata to evaluate
             user_library: User's library books
+            user_id: Owner of the library, used to cache its prompt section
 
         Returns:
             List of dicts with keys: title, score, explanation
@@ -126,59 +231,20 @@ If you cannot identify any book titles with reasonable confidence, return an emp
         if not detected_books:
             return []
 
-        prompt = self._build_batch_recommendation_prompt(detected_books, user_library)
-
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a book recommendation expert. Respond only with valid JSON.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.3,
-                max_tokens=2000,  # More tokens for multiple books
+            raw_response = await self.client.chat.completions.with_raw_response.create(
+                **self._scoring_request_body(detected_books, user_library, user_id)
             )
+            self._track_rate_limit(raw_response.headers)
+            response = raw_response.parse()
 
             content = response.choices[0].message.content
             if not content:
                 raise ValueError("Empty response from OpenAI")
 
-            # Clean markdown code blocks if present
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-
-            # Parse JSON response
-            results = json.loads(content)
-
-            if not isinstance(results, list):
-                raise ValueError("Expected JSON array response")
-
-            # Extract scores and explanations with title for safe matching
-            parsed_results = []
-            for result in results:
-                title = result.get("title", "")
-                score = float(result.get("score", 0.0))
-                explanation = result.get("explanation", "No explanation provided")
-                # Clamp score to valid range
-                score = max(0.0, min(1.0, score))
-                parsed_results.append({
-                    "title": title,
-                    "score": score,
-                    "explanation": explanation
-                })
-
-            return parsed_results
-
-        except json.JSONDecodeError as e:
+            return self._parse_match_scores(content)
+
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON response from OpenAI: {e}") from e
         except Exception as e:
             raise RuntimeError(f"OpenAI batch API error: {e}") from e
@@ -1,22 +1,39 @@
 """Recommendation service for suggesting books based on user's library."""
 
-import json
 import logging
+from dataclasses import asdict
+from functools import lru_cache
 from typing import Any
 
-from sqlmodel import Session, select
+import orjson
+from sqlalchemy import Row, select
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
 from app.models import Book, UserLibrary
+from app.services.google_books_service import BookHit
 
 logger = logging.getLogger(__name__)
 
+# Book columns needed for scoring; projecting these avoids hydrating full ORM objects
+LIBRARY_BOOK_COLUMNS = (
+    col(Book.title),
+    col(Book.author),
+    col(Book.categories),
+    col(Book.description),
+    col(Book.average_rating),
+    col(Book.ratings_count),
+    col(Book.google_books_id),
+)
+
+
 class RecommendationService:
     """Service for generating book recommendations."""
 
     @staticmethod
     def calculate_match_score_rule_based(
-        detected_book: dict[str, Any], user_library: list[Book]
+        detected_book: BookHit, user_library: list[Row[Any]]
     ) -> float:
         """
         Calculate how well a detected book matches user's reading preferences.
@@ -30,7 +47,7 @@ class RecommendationService:
         """
         if not user_library:
             # No library to compare against, use rating as fallback
-            rating = detected_book.get("average_rating", 0.0)
+            rating = detected_book.average_rating
             return min((rating or 0.0) / 5.0, 1.0)
 
         score = 0.0
@@ -42,11 +59,11 @@ class RecommendationService:
         }
 
         # Extract detected book info
-        detected_author = detected_book.get("author", "").lower()
+        detected_author = (detected_book.author or "").lower()
         detected_categories = RecommendationService._parse_categories(
-            detected_book.get("categories")
+            detected_book.categories
         )
-        detected_rating = detected_book.get("average_rating", 0.0)
+        detected_rating = detected_book.average_rating
 
         # Author matching
         library_authors = {
@@ -59,7 +76,7 @@ class RecommendationService:
             score += weights["author"]
 
         # Category matching
-        library_categories = set()
+        library_categories: set[str] = set()
         for book in user_library:
             if book.categories:
                 library_categories.update(
@@ -81,7 +98,7 @@ class RecommendationService:
             score += weights["rating"] * rating_score
 
         # Popularity score based on ratings count
-        ratings_count = detected_book.get("ratings_count", 0)
+        ratings_count = detected_book.ratings_count
         if ratings_count:
             # Log scale for popularity (1000+ ratings = max score)
             popularity_score = min(ratings_count / 1000.0, 1.0)
@@ -90,52 +107,58 @@ class RecommendationService:
         return min(score, 1.0)
 
     @staticmethod
-    def _parse_categories(categories_str: str | None) -> set[str]:
+    @lru_cache(maxsize=4096)
+    def _parse_categories(categories_str: str | None) -> frozenset[str]:
         """
         Parse categories JSON string into a set of lowercase categories.
 
+        Memoized: the same category strings recur across library books and scans.
+
         Args:
             categories_str: JSON string of categories
 
         Returns:
-            Set of lowercase category strings
+            Frozen set of lowercase category strings
         """
         if not categories_str:
-            return set()
+            return frozenset()
 
         try:
-            categories = json.loads(categories_str)
-            return {cat.lower() for cat in categories if isinstance(cat, str)}
-        except (json.JSONDecodeError, TypeError):
-            return set()
+            categories = orjson.loads(categories_str)
+            return frozenset(cat.lower() for cat in categories if isinstance(cat, str))
+        except (orjson.JSONDecodeError, TypeError):
+            return frozenset()
 
     @staticmethod
-    def get_user_library_books(session: Session, user_id: str) -> list[Book]:
+    async def get_user_library_books(
+        session: AsyncSession, user_id: str
+    ) -> list[Row[Any]]:
         """
         Get all books in user's library.
 
+        Only the columns used for scoring are loaded.
+
         Args:
             session: Database session
             user_id: User UUID
 
         Returns:
-            List of Book objects
+            List of rows with LIBRARY_BOOK_COLUMNS attributes
         """
         statement = (
-            select(Book)
+            select(*LIBRARY_BOOK_COLUMNS)
             .join(UserLibrary)
-            .where(UserLibrary.user_id == user_id)
+            .where(col(UserLibrary.user_id) == user_id)
         )
-        results = session.exec(statement)
-        return list(results.all())
-
+        result = await session.execute(statement)
+        return list(result.all())
 
     @staticmethod
     async def filter_and_rank_recommendations(
-        detected_books: list[dict[str, Any]],
-        user_library: list[Book],
+        detected_books: list[BookHit],
+        user_library: list[Row[Any]],
         user_id: str,
-    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    ) -> tuple[list[BookHit], list[BookHit]]:
         """
         Filter and rank detected books into recommendations.
 
@@ -150,14 +173,35 @@ class RecommendationService:
         all_books = []
         recommendations = []
 
+        # Build set of google_books_ids from user's library for O(1) lookup
+        library_google_ids = {
+            book.google_books_id
+            for book in user_library
+            if book.google_books_id
+        }
+
+        # Books the user already owns are never recommended, so they don't need
+        # an LLM opinion; score them locally and send only the rest
+        books_to_score = []
+        for book in detected_books:
+            google_books_id = book.google_books_id
+            book.in_library = google_books_id in library_google_ids if google_books_id else False
+            if book.in_library:
+                book.match_score = RecommendationService.calculate_match_score_rule_based(
+                    book, user_library
+                )
+                book.recommendation_explanation = "Already in your library"
+            else:
+                books_to_score.append(book)
+
         # Calculate match scores - use batch scoring for efficiency
-        if settings.LLM_ENABLED and detected_books:
+        if settings.LLM_ENABLED and books_to_score:
             try:
                 # Import here to avoid circular imports
                 from app.services.llm.factory import calculate_batch_scores_with_fallback
-                from app.services.llm.base import sample_library_books
+                from app.services.llm.base import dedupe_library_books, sample_library_books
 
-                # Convert Book objects to dicts for LLM
+                # Convert library rows to dicts for LLM
                 library_dicts = [
                     {
                         "title": book.title,
@@ -170,74 +214,61 @@ class RecommendationService:
                     for book in user_library
                 ]
 
-                # Sample library books with deterministic shuffling to avoid bias
-                sampled_library = sample_library_books(library_dicts, user_id)
+                # Drop duplicate editions, then sample with deterministic shuffling
+                # to avoid bias
+                sampled_library = sample_library_books(
+                    dedupe_library_books(library_dicts), user_id
+                )
 
                 # Get all scores in a single batch LLM call
-                logger.info(f"Batch scoring {len(detected_books)} books with LLM")
+                logger.info(
+                    f"Batch scoring {len(books_to_score)} books with LLM "
+                    f"({len(detected_books) - len(books_to_score)} already in library)"
+                )
                 batch_results = await calculate_batch_scores_with_fallback(
-                    detected_books, sampled_library
+                    [asdict(book) for book in books_to_score], sampled_library, user_id
                 )
 
-                # Create a mapping of title -> (score, explanation) for safe matching
-                results_by_title = {
-                    result["title"]: (result["score"], result["explanation"])
-                    for result in batch_results
-                }
-
-                # Apply scores to books by matching titles
-                for book in detected_books:
-                    book_title = book.get("title", "")
-                    if book_title in results_by_title:
-                        match_score, explanation = results_by_title[book_title]
-                        book["match_score"] = match_score
-                        book["recommendation_explanation"] = explanation
+                # Results come back in book order, None where the LLM gave no score
+                for book, result in zip(books_to_score, batch_results, strict=True):
+                    if result is not None:
+                        book.match_score = result["score"]
+                        book.recommendation_explanation = result["explanation"]
                     else:
                         # Fallback if LLM didn't return this book (shouldn't happen)
-                        logger.warning(f"LLM did not return score for book: {book_title}")
-                        book["match_score"] = RecommendationService.calculate_match_score_rule_based(
+                        logger.warning(f"LLM did not return score for book: {book.title}")
+                        book.match_score = RecommendationService.calculate_match_score_rule_based(
                             book, user_library
                         )
-                        book["recommendation_explanation"] = "Rule-based recommendation (LLM missing)"
+                        book.recommendation_explanation = "Rule-based recommendation (LLM missing)"
 
             except Exception as e:
                 # Fallback to rule-based scoring for all books if batch fails
                 logger.error(f"Batch LLM scoring failed: {str(e)}, falling back to rule-based")
-                for book in detected_books:
+                for book in books_to_score:
                     match_score = RecommendationService.calculate_match_score_rule_based(
                         book, user_library
                     )
-                    book["match_score"] = match_score
-                    book["recommendation_explanation"] = "Rule-based recommendation (LLM batch error)"
+                    book.match_score = match_score
+                    book.recommendation_explanation = "Rule-based recommendation (LLM batch error)"
         else:
             # Use rule-based scoring
-            for book in detected_books:
+            for book in books_to_score:
                 match_score = RecommendationService.calculate_match_score_rule_based(
                     book, user_library
                 )
-                book["match_score"] = match_score
-                book["recommendation_explanation"] = "Rule-based recommendation"
+                book.match_score = match_score
+                book.recommendation_explanation = "Rule-based recommendation"
 
-        # Build set of google_books_ids from user's library for O(1) lookup
-        library_google_ids = {
-            book.google_books_id
-            for book in user_library
-            if book.google_books_id
-        }
-
-        # Check if each book is in library and build results
+        # Build results
         for book in detected_books:
-            google_books_id = book.get("google_books_id")
-            in_library = google_books_id in library_google_ids if google_books_id else False
-            book["in_library"] = in_library
-
             all_books.append(book)
 
             # Only recommend books not in library
-            if not in_library:
+            if not book.in_library:
                 recommendations.append(book)
 
         # Sort recommendations by match score (descending)
-        recommendations.sort(key=lambda x: x["match_score"], reverse=True)
+        recommendations.sort(key=lambda x: x.match_score, reverse=True)
 
         return all_books, recommendations
@@ -0,0 +1,24 @@
+"""Text normalization shared by book matching and caching."""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 4096  # Distinct titles/authors kept normalized
+
+# Punctuation ignored when comparing titles and authors
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """
+    Normalize a title or author for fuzzy matching and cache keys.
+
+    Lowercases, strips accents and punctuation and collapses whitespace, so
+    OCR variants like "Les Misérables " and "les miserables." compare equal.
+    Non-Latin scripts are kept (only combining marks are dropped).
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(PUNCTUATION_RE.sub(" ", stripped.casefold()).split())
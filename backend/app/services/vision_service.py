@@ -1,14 +1,15 @@
 """Vision service for extracting book titles from images using Vision Language Models."""
 
-import json
 import logging
 import re
 import time
 from typing import Any
 
+import orjson
 from pydantic import BaseModel, Field, validator
 
 from app.core.config import settings
+from app.services.llm.base import strip_markdown_fence
 
 # Enable HEIC/HEIF format support (Apple's image format)
 try:
@@ -141,23 +142,16 @@ class VisionService:
             # Parse and validate JSON response
             try:
                 # Clean markdown code blocks if present
-                response_text = raw_response.strip()
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
+                response_text = strip_markdown_fence(raw_response)
 
                 # Try to parse JSON, with repair attempt on failure
                 try:
-                    parsed = json.loads(response_text)
-                except json.JSONDecodeError:
+                    parsed = orjson.loads(response_text)
+                except orjson.JSONDecodeError:
                     # Attempt to repair common JSON issues
                     logger.warning("Initial JSON parse failed, attempting repair...")
                     repaired = repair_json(response_text)
-                    parsed = json.loads(repaired)  # This will raise if repair didn't work
+                    parsed = orjson.loads(repaired)  # This will raise if repair didn't work
 
                 # Validate with Pydantic
                 validated = VLMTitleExtractionResponse(
@@ -185,7 +179,7 @@ class VisionService:
 
                 return titles
 
-            except (json.JSONDecodeError, ValueError) as e:
+            except (orjson.JSONDecodeError, ValueError) as e:
                 logger.error(f"VLM returned invalid JSON: {e}")
                 logger.error(f"Raw response (first 500 chars): {raw_response[:500]}")
                 logger.error(f"Cleaned response (first 500 chars): {response_text[:500]}")
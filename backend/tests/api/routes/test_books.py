@@ -0,0 +1,127 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services.google_books_service import BookHit, GoogleBooksService
+from app.services.vision_service import VisionService
+from tests.utils.utils import random_lower_string
+
+
+def test_scan_falls_back_to_single_search_for_batch_misses(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    detected_titles = [
+        {"title": "Emma", "author": "Jane Austen", "confidence": 0.9},
+        {"title": "Dune", "author": "Frank Herbert", "confidence": 0.8},
+    ]
+    emma = BookHit(
+        title="Emma", author="Jane Austen", google_books_id=random_lower_string()
+    )
+    dune = BookHit(
+        title="Dune", author="Frank Herbert", google_books_id=random_lower_string()
+    )
+
+    with (
+        patch.object(settings, "LLM_ENABLED", False),
+        patch.object(
+            VisionService,
+            "extract_book_titles",
+            AsyncMock(return_value=detected_titles),
+        ),
+        patch.object(
+            GoogleBooksService,
+            "batch_fuzzy_search",
+            AsyncMock(return_value=[emma, None]),
+        ) as batch_search,
+        patch.object(
+            GoogleBooksService, "fuzzy_search_book", AsyncMock(return_value=dune)
+        ) as single_search,
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/books/scan",
+            headers=normal_user_token_headers,
+            files={"file": ("shelf.jpg", b"\xff\xd8\xff image", "image/jpeg")},
+        )
+
+    assert r.status_code == 200
+    detected = {book["title"]: book for book in r.json()["detected_books"]}
+    assert set(detected) == {"Emma", "Dune"}
+    assert detected["Dune"]["confidence"] == 0.8
+    batch_search.assert_awaited_once_with(
+        [("Emma", "Jane Austen"), ("Dune", "Frank Herbert")]
+    )
+    single_search.assert_awaited_once_with("Dune", author="Frank Herbert")
+
+
+def test_add_book_to_library(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    google_books_id = random_lower_string()
+    book = BookHit(title="Emma", author="Jane Austen", google_books_id=google_books_id)
+
+    with patch.object(
+        GoogleBooksService, "get_book_by_id", AsyncMock(return_value=book)
+    ) as get_book:
+        r = client.post(
+            f"{settings.API_V1_STR}/books/library/add/{google_books_id}",
+            headers=normal_user_token_headers,
+        )
+        assert r.status_code == 200
+        assert r.json()["title"] == "Emma"
+        assert r.json()["google_books_id"] == google_books_id
+
+        # Already in the library: rejected before Google Books is called again
+        r = client.post(
+            f"{settings.API_V1_STR}/books/library/add/{google_books_id}",
+            headers=normal_user_token_headers,
+        )
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Book already in your library"
+        get_book.assert_awaited_once_with(google_books_id)
+
+
+def test_add_book_already_added_by_another_user_updates_it(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    google_books_id = random_lower_string()
+    first = BookHit(title="Emma", google_books_id=google_books_id)
+    updated = BookHit(
+        title="Emma", author="Jane Austen", google_books_id=google_books_id
+    )
+
+    with patch.object(
+        GoogleBooksService, "get_book_by_id", AsyncMock(return_value=first)
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/books/library/add/{google_books_id}",
+            headers=superuser_token_headers,
+        )
+    assert r.status_code == 200
+    book_id = r.json()["id"]
+
+    with patch.object(
+        GoogleBooksService, "get_book_by_id", AsyncMock(return_value=updated)
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/books/library/add/{google_books_id}",
+            headers=normal_user_token_headers,
+        )
+    assert r.status_code == 200
+    assert r.json()["id"] == book_id
+    assert r.json()["author"] == "Jane Austen"
+
+
+def test_add_book_not_found(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with patch.object(
+        GoogleBooksService, "get_book_by_id", AsyncMock(return_value=None)
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/books/library/add/{random_lower_string()}",
+            headers=normal_user_token_headers,
+        )
+    assert r.status_code == 404
@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_provider_health(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/health/providers/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    health = r.json()
+    assert set(health) == {"openai", "anthropic", "google"}
+    for stats in health.values():
+        assert isinstance(stats["calls"], int)
+        assert 0.0 <= stats["success_rate"] <= 1.0
+
+
+def test_provider_health_requires_superuser(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/health/providers/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
@@ -0,0 +1,174 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import pytest
+
+from app.services import google_books_service
+from app.services.google_books_service import MAX_RETRIES, GoogleBooksService
+
+Handler = Callable[[httpx.Request], httpx.Response]
+
+
+def volume(volume_id: str, title: str, author: str) -> dict[str, Any]:
+    return {"id": volume_id, "volumeInfo": {"title": title, "authors": [author]}}
+
+
+@pytest.fixture
+def google_books(
+    monkeypatch: pytest.MonkeyPatch,
+) -> Callable[[Handler], list[httpx.Request]]:
+    """Route Google Books requests to a handler, with empty caches."""
+    monkeypatch.setattr(google_books_service, "_lookup_cache", {})
+    monkeypatch.setattr(google_books_service, "_negative_cache", {})
+
+    def use(handler: Handler) -> list[httpx.Request]:
+        requests: list[httpx.Request] = []
+
+        def record(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return handler(request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        monkeypatch.setattr(google_books_service, "_client", client)
+        return requests
+
+    return use
+
+
+def test_get_retries_throttled_requests(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json=volume("1", "Emma", "Jane Austen")),
+    ]
+    requests = google_books(lambda _request: responses.pop(0))
+
+    book = asyncio.run(GoogleBooksService.get_book_by_id("1"))
+
+    assert len(requests) == 2
+    assert book is not None and book.title == "Emma"
+
+
+def test_get_gives_up_after_max_retries(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    requests = google_books(
+        lambda _request: httpx.Response(503, headers={"Retry-After": "0"})
+    )
+
+    assert asyncio.run(GoogleBooksService.get_book_by_id("1")) is None
+    assert len(requests) == MAX_RETRIES + 1
+
+
+def test_get_does_not_retry_client_errors(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    requests = google_books(lambda _request: httpx.Response(404))
+
+    assert asyncio.run(GoogleBooksService.get_book_by_id("missing")) is None
+    assert len(requests) == 1
+
+
+def test_get_book_by_id_is_cached(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    requests = google_books(
+        lambda _request: httpx.Response(200, json=volume("1", "Emma", "Jane Austen"))
+    )
+
+    book = asyncio.run(GoogleBooksService.get_book_by_id("1"))
+    assert book is not None
+    book.confidence = 0.5  # Callers annotate results in place
+    cached = asyncio.run(GoogleBooksService.get_book_by_id("1"))
+
+    assert len(requests) == 1
+    assert cached is not None and cached.confidence == 0.0
+
+
+def test_fuzzy_search_caches_hits_and_misses(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    items = [volume("1", "Emma", "Jane Austen")]
+    requests = google_books(
+        lambda request: httpx.Response(
+            200, json={"items": items} if "Emma" in request.url.params["q"] else {}
+        )
+    )
+
+    asyncio.run(GoogleBooksService.fuzzy_search_book("Emma"))
+    match = asyncio.run(GoogleBooksService.fuzzy_search_book("emma "))
+    asyncio.run(GoogleBooksService.fuzzy_search_book("Middlemarch"))
+    miss = asyncio.run(GoogleBooksService.fuzzy_search_book("Middlemarch"))
+
+    assert len(requests) == 2
+    assert match is not None and match.google_books_id == "1"
+    assert miss is None
+
+
+def test_batch_fuzzy_search_matches_titles_from_one_query(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    items = [volume("1", "Emma", "Jane Austen"), volume("2", "Dune", "Frank Herbert")]
+    requests = google_books(lambda _request: httpx.Response(200, json={"items": items}))
+
+    matches = asyncio.run(
+        GoogleBooksService.batch_fuzzy_search(
+            [("Emma", "Jane Austen"), ("Dune", None), ("Middlemarch", "George Eliot")]
+        )
+    )
+
+    assert len(requests) == 1
+    assert requests[0].url.params["q"] == (
+        'intitle:"Emma"|intitle:"Dune"|intitle:"Middlemarch"'
+    )
+    assert [match.google_books_id if match else None for match in matches] == [
+        "1",
+        "2",
+        None,
+    ]
+
+
+def test_batch_fuzzy_search_serves_matches_from_cache(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    items = [volume("1", "Emma", "Jane Austen")]
+    requests = google_books(lambda _request: httpx.Response(200, json={"items": items}))
+
+    asyncio.run(GoogleBooksService.batch_fuzzy_search([("Emma", None)]))
+    matches = asyncio.run(GoogleBooksService.batch_fuzzy_search([("EMMA", None)]))
+
+    assert len(requests) == 1
+    assert matches[0] is not None and matches[0].google_books_id == "1"
+
+
+def test_fuzzy_search_ignores_case_and_punctuation(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    items = [volume("1", "The Hobbit", "J.R.R. Tolkien")]
+    google_books(lambda _request: httpx.Response(200, json={"items": items}))
+
+    match = asyncio.run(
+        GoogleBooksService.fuzzy_search_book("THE HOBBIT!", author="J.R.R. TOLKIEN")
+    )
+
+    assert match is not None and match.match_score == 1.0
+
+
+def test_fuzzy_search_prefers_exact_hit_with_matching_author(
+    google_books: Callable[[Handler], list[httpx.Request]],
+) -> None:
+    items = [
+        {"id": "1", "volumeInfo": {"title": "Dune"}},
+        volume("2", "Dune", "Frank Herbert"),
+    ]
+    google_books(lambda _request: httpx.Response(200, json={"items": items}))
+
+    match = asyncio.run(
+        GoogleBooksService.fuzzy_search_book("Dune", author="Frank Herbert")
+    )
+
+    assert match is not None and match.google_books_id == "2"
+    assert match.match_score == 1.0
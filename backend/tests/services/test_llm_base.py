@@ -0,0 +1,306 @@
+import asyncio
+import io
+import os
+import time
+from typing import Any
+
+import pytest
+from PIL import Image
+
+from app.services.llm.base import (
+    MAX_BOOKS_PER_PROMPT,
+    VISION_MAX_IMAGE_SIDE,
+    VISION_REENCODE_MIN_BYTES,
+    AdaptiveConcurrencyLimit,
+    LLMProvider,
+    detect_image_media_type,
+    library_fingerprint,
+    prepare_vision_image,
+)
+
+
+class StubProvider(LLMProvider):
+    """Provider with canned answers, for exercising the shared base class."""
+
+    max_concurrent_scoring_calls = 2
+
+    def __init__(self) -> None:
+        self.calls: list[list[dict[str, Any]]] = []
+        self.in_flight = self.peak = 0
+
+    async def calculate_batch_match_scores(
+        self,
+        detected_books: list[dict[str, Any]],
+        user_library: list[dict[str, Any]],
+        user_id: str | None = None,
+    ) -> list[dict[str, Any]]:
+        self.calls.append(detected_books)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return [
+            {"title": book["title"], "score": 0.5, "explanation": ""}
+            for book in detected_books
+        ]
+
+    async def extract_titles_from_image(self, image_bytes: bytes) -> str:
+        return "[]"
+
+    def is_available(self) -> bool:
+        return True
+
+
+def test_parse_match_scores_reads_results_object() -> None:
+    content = '{"results": [{"title": "Emma", "score": 1.4, "explanation": "Austen"}]}'
+
+    assert StubProvider()._parse_match_scores(content) == [
+        {"title": "Emma", "score": 1.0, "explanation": "Austen"}
+    ]
+
+
+def test_parse_match_scores_accepts_fenced_bare_array() -> None:
+    content = '```json\n[{"title": "Emma", "score": 0.5}]\n```'
+
+    assert StubProvider()._parse_match_scores(content) == [
+        {"title": "Emma", "score": 0.5, "explanation": "No explanation provided"}
+    ]
+
+
+def test_parse_match_scores_rejects_object_without_results() -> None:
+    with pytest.raises(ValueError):
+        StubProvider()._parse_match_scores('{"title": "Emma", "score": 0.5}')
+
+
+def test_library_fingerprint_covers_rendered_metadata() -> None:
+    book = {"title": "Dune", "author": "Frank Herbert", "average_rating": 4.2}
+    rerated = {**book, "average_rating": 4.3}
+
+    assert library_fingerprint([book]) == library_fingerprint([dict(book)])
+    assert library_fingerprint([book]) != library_fingerprint([rerated])
+
+
+def test_cached_library_summary_follows_metadata_changes() -> None:
+    provider = StubProvider()
+    book = {"title": "Dune", "author": "Frank Herbert", "ratings_count": 1000}
+
+    provider._get_library_summary([book], "user-1")
+    summary = provider._get_library_summary([{**book, "ratings_count": 2000}], "user-1")
+
+    assert "2,000 readers" in summary
+
+
+def test_scoring_waits_out_rate_limit_pause_without_holding_a_slot() -> None:
+    class PausedProvider(StubProvider):
+        paused_until = time.monotonic() + 0.05
+
+        def rate_limit_pause(self) -> float:
+            return self.paused_until - time.monotonic()
+
+    provider = PausedProvider()
+
+    async def score_during_pause() -> list[dict[str, Any]]:
+        task = asyncio.create_task(
+            provider.score_detected_books([{"title": "Emma"}], [])
+        )
+        await asyncio.sleep(0.01)
+        assert provider._scoring_limit._in_flight == 0
+        assert not provider.calls
+        return await task
+
+    assert asyncio.run(score_during_pause()) == [
+        {"title": "Emma", "score": 0.5, "explanation": ""}
+    ]
+    assert len(provider.calls) == 1
+
+
+def test_slot_returned_for_a_pause_does_not_raise_the_limit() -> None:
+    class PausedWhileQueuedProvider(StubProvider):
+        max_concurrent_scoring_calls = 8
+        checks = 0
+
+        def rate_limit_pause(self) -> float:
+            # The pause starts after the first check, while the batch queues
+            self.checks += 1
+            return 0.001 if self.checks == 2 else 0.0
+
+    provider = PausedWhileQueuedProvider()
+    provider._scoring_limit.limit = 1.0
+
+    asyncio.run(provider.score_detected_books([{"title": "Emma"}], []))
+
+    assert provider.checks == 4
+    assert len(provider.calls) == 1
+    # One successful call adds 1/limit once, not once per slot taken
+    assert provider._scoring_limit.limit == 2.0
+    assert provider._scoring_limit._in_flight == 0
+
+
+def test_small_scans_are_scored_in_one_call() -> None:
+    provider = StubProvider()
+    books = [{"title": "Emma"}, {"title": "Dune"}]
+
+    results = asyncio.run(provider.score_detected_books(books, []))
+
+    assert provider.calls == [books]
+    assert [result["title"] for result in results] == ["Emma", "Dune"]
+
+
+def test_large_scans_are_scored_in_limited_concurrent_batches() -> None:
+    provider = StubProvider()
+    books = [{"title": f"Book {i}"} for i in range(4 * MAX_BOOKS_PER_PROMPT)]
+
+    results = asyncio.run(provider.score_detected_books(books, []))
+
+    assert len(provider.calls) == 4
+    assert provider.peak == 2
+    assert [result["title"] for result in results] == [book["title"] for book in books]
+
+
+def test_failed_batch_cancels_the_other_batches() -> None:
+    class FailingProvider(StubProvider):
+        max_concurrent_scoring_calls = 8
+        cancelled = 0
+
+        async def calculate_batch_match_scores(
+            self,
+            detected_books: list[dict[str, Any]],
+            user_library: list[dict[str, Any]],
+            user_id: str | None = None,
+        ) -> list[dict[str, Any]]:
+            if detected_books[0]["title"] == "Book 0":
+                raise RuntimeError("bad response")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return []
+
+    provider = FailingProvider()
+    books = [{"title": f"Book {i}"} for i in range(3 * MAX_BOOKS_PER_PROMPT)]
+
+    async def score() -> int:
+        with pytest.raises(RuntimeError, match="bad response"):
+            await provider.score_detected_books(books, [])
+        # Checked before asyncio.run() cancels leftover tasks on exit
+        return provider.cancelled
+
+    assert asyncio.run(score()) == 2
+
+
+@pytest.mark.parametrize(
+    ("image_bytes", "media_type"),
+    [
+        (b"\x89PNG\r\n\x1a\n", "image/png"),
+        (b"\xff\xd8\xff\xe0", "image/jpeg"),
+        (b"GIF89a", "image/gif"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    ],
+)
+def test_detect_image_media_type(image_bytes: bytes, media_type: str) -> None:
+    assert detect_image_media_type(image_bytes) == media_type
+
+
+def test_detect_image_media_type_falls_back_to_jpeg() -> None:
+    assert detect_image_media_type(b"BM not an image") == "image/jpeg"
+
+
+def noisy_jpeg(width: int, height: int, orientation: int | None = None) -> bytes:
+    """JPEG of random pixels, which barely compresses."""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=100, exif=exif)
+    return buffer.getvalue()
+
+
+def test_prepare_vision_image_keeps_small_images() -> None:
+    image_bytes = noisy_jpeg(64, 64)
+
+    assert prepare_vision_image(image_bytes) is image_bytes
+
+
+def test_prepare_vision_image_downscales_large_images() -> None:
+    image_bytes = noisy_jpeg(3000, 1200)
+    assert len(image_bytes) > VISION_REENCODE_MIN_BYTES
+
+    prepared = prepare_vision_image(image_bytes)
+
+    assert len(prepared) < len(image_bytes)
+    image = Image.open(io.BytesIO(prepared))
+    assert image.format == "JPEG"
+    assert max(image.size) <= VISION_MAX_IMAGE_SIDE
+
+
+def test_prepare_vision_image_applies_exif_rotation() -> None:
+    # Orientation 6: stored landscape, displayed rotated to portrait
+    prepared = prepare_vision_image(noisy_jpeg(3000, 1200, orientation=6))
+
+    width, height = Image.open(io.BytesIO(prepared)).size
+    assert height > width
+
+
+def test_prepare_vision_image_sends_undecodable_bytes_as_is() -> None:
+    image_bytes = b"\xff\xd8\xff" + bytes(VISION_REENCODE_MIN_BYTES)
+
+    assert prepare_vision_image(image_bytes) is image_bytes
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_adaptive_concurrency_limit_caps_calls_in_flight() -> None:
+    limit = AdaptiveConcurrencyLimit(2)
+    in_flight = peak = 0
+
+    async def call() -> None:
+        nonlocal in_flight, peak
+        async with limit:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+
+    async def run_calls() -> None:
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run_calls())
+
+    assert peak == 2
+
+
+def test_adaptive_concurrency_limit_backs_off_on_rate_limits() -> None:
+    limit = AdaptiveConcurrencyLimit(8)
+
+    async def rate_limited_call() -> None:
+        async with limit:
+            raise RuntimeError("OpenAI batch API error") from RateLimitError()
+
+    async def successful_call() -> None:
+        async with limit:
+            pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(rate_limited_call())
+    assert limit.limit == 4
+
+    # Each success adds 1/limit, so about a round of calls per slot
+    for _ in range(40):
+        asyncio.run(successful_call())
+    assert limit.limit == 8
+
+
+def test_adaptive_concurrency_limit_ignores_other_errors() -> None:
+    limit = AdaptiveConcurrencyLimit(8)
+
+    async def failing_call() -> None:
+        async with limit:
+            raise ValueError("bad response")
+
+    with pytest.raises(ValueError):
+        asyncio.run(failing_call())
+    assert limit.limit == 8
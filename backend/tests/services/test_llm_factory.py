@@ -0,0 +1,507 @@
+import asyncio
+from collections.abc import Callable
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm import factory
+from app.services.llm.factory import PROVIDER_RECOVERY_HALF_LIFE, ProviderStats
+
+
+@pytest.fixture
+def provider_stats(monkeypatch: pytest.MonkeyPatch) -> dict[str, ProviderStats]:
+    stats = {name: ProviderStats() for name in factory.PROVIDER_CLASSES}
+
+    async def available() -> list[str]:
+        return ["google", "openai"]
+
+    monkeypatch.setattr(factory, "_provider_stats", stats)
+    monkeypatch.setattr(factory, "get_available_providers", available)
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "google")
+    return stats
+
+
+def test_failing_provider_is_demoted(provider_stats: dict[str, ProviderStats]) -> None:
+    for _ in range(5):
+        provider_stats["google"].record(1.0, ok=False)
+
+    assert asyncio.run(factory._ordered_providers()) == ("openai", "google")
+
+
+def test_demoted_provider_recovers_while_idle(
+    provider_stats: dict[str, ProviderStats],
+) -> None:
+    google = provider_stats["google"]
+    for _ in range(5):
+        google.record(1.0, ok=False)
+    assert asyncio.run(factory._ordered_providers()) == ("openai", "google")
+
+    google.last_call -= 5 * PROVIDER_RECOVERY_HALF_LIFE
+
+    assert asyncio.run(factory._ordered_providers()) == ("google", "openai")
+
+
+def test_recovered_provider_is_demoted_again_if_still_failing(
+    provider_stats: dict[str, ProviderStats],
+) -> None:
+    google = provider_stats["google"]
+    for _ in range(5):
+        google.record(1.0, ok=False)
+    google.last_call -= 5 * PROVIDER_RECOVERY_HALF_LIFE
+
+    for _ in range(5):
+        google.record(1.0, ok=False)
+
+    assert asyncio.run(factory._ordered_providers()) == ("openai", "google")
+
+
+def test_healthy_providers_keep_the_configured_order(
+    provider_stats: dict[str, ProviderStats],
+) -> None:
+    provider_stats["google"].record(1.0, ok=False)
+
+    assert asyncio.run(factory._ordered_providers()) == ("google", "openai")
+
+
+def test_ordered_providers_requires_a_configured_provider(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def available() -> list[str]:
+        return []
+
+    monkeypatch.setattr(factory, "get_available_providers", available)
+
+    with pytest.raises(RuntimeError, match="No LLM providers are configured"):
+        asyncio.run(factory._ordered_providers())
+
+
+class FakeScorer:
+    """Provider stand-in answering batch scoring calls with canned results."""
+
+    def __init__(self, scores: list[dict]) -> None:
+        self.scores = scores
+        self.calls: list[list[dict]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def score_detected_books(
+        self, detected_books: list[dict], user_library: list[dict], user_id: str | None
+    ) -> list[dict]:
+        self.calls.append(detected_books)
+        await self.release.wait()
+        return self.scores
+
+
+@pytest.fixture
+def use_scorer(monkeypatch: pytest.MonkeyPatch) -> Callable[["FakeScorer"], None]:
+    async def available() -> list[str]:
+        return ["google"]
+
+    monkeypatch.setattr(factory, "_batch_score_cache", {})
+    monkeypatch.setattr(factory, "_inflight_scores", {})
+    monkeypatch.setattr(factory, "get_available_providers", available)
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "google")
+
+    def use(scorer: FakeScorer) -> None:
+        monkeypatch.setattr(factory, "_get_provider", lambda _name: scorer)
+
+    return use
+
+
+LIBRARY = [{"title": "Dune", "author": "Frank Herbert"}]
+
+
+def test_batch_scores_keep_same_titled_books_apart(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    books = [
+        {"title": "Persuasion", "author": "Jane Austen"},
+        {"title": "Persuasion", "author": "Robert Cialdini"},
+    ]
+    use_scorer(
+        FakeScorer(
+            [
+                {"title": "Persuasion", "score": 0.9, "explanation": "novel"},
+                {"title": "Persuasion", "score": 0.2, "explanation": "psychology"},
+            ]
+        )
+    )
+
+    results = asyncio.run(factory.calculate_batch_scores_with_fallback(books, LIBRARY))
+
+    assert [r["explanation"] for r in results] == ["novel", "psychology"]
+
+
+def test_batch_scores_match_echoed_titles_loosely(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    books = [
+        {"title": "The Hobbit", "author": "J.R.R. Tolkien"},
+        {"title": "Emma", "author": "Jane Austen"},
+    ]
+    # Reordered, with the case and punctuation of the titles changed
+    use_scorer(
+        FakeScorer(
+            [
+                {"title": "emma.", "score": 0.4, "explanation": "emma"},
+                {"title": "THE HOBBIT", "score": 0.8, "explanation": "hobbit"},
+            ]
+        )
+    )
+
+    results = asyncio.run(factory.calculate_batch_scores_with_fallback(books, LIBRARY))
+
+    assert [(r["title"], r["explanation"]) for r in results] == [
+        ("The Hobbit", "hobbit"),
+        ("Emma", "emma"),
+    ]
+
+
+def test_batch_scores_report_missing_books_as_none(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    books = [{"title": "Emma", "author": "Jane Austen"}, {"title": "Ulysses"}]
+    use_scorer(FakeScorer([{"title": "Emma", "score": 0.4, "explanation": "emma"}]))
+
+    results = asyncio.run(factory.calculate_batch_scores_with_fallback(books, LIBRARY))
+
+    assert results[0]["explanation"] == "emma"
+    assert results[1] is None
+
+
+def test_batch_scores_are_served_from_cache(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    scores = [
+        {"title": "Emma", "score": 0.4, "explanation": "emma"},
+        {"title": "Ulysses", "score": 0.1, "explanation": "ulysses"},
+    ]
+    scorer = FakeScorer(scores)
+    use_scorer(scorer)
+
+    asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "Emma"}, {"title": "Ulysses"}], LIBRARY
+        )
+    )
+    results = asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "Ulysses"}, {"title": "Emma"}], LIBRARY
+        )
+    )
+
+    assert len(scorer.calls) == 1
+    assert results == scores[::-1]
+
+
+def test_cached_scores_match_title_variants(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    scorer = FakeScorer([{"title": "Emma", "score": 0.4, "explanation": "emma"}])
+    use_scorer(scorer)
+
+    asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "Emma", "author": "Jane Austen"}], LIBRARY
+        )
+    )
+    results = asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "EMMA.", "author": "jane  austen"}], LIBRARY
+        )
+    )
+
+    assert len(scorer.calls) == 1
+    assert results == [{"title": "EMMA.", "score": 0.4, "explanation": "emma"}]
+
+
+def test_only_uncached_books_are_scored(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    emma = {"title": "Emma", "score": 0.4, "explanation": "emma"}
+    dune = {"title": "Dune", "score": 0.9, "explanation": "dune"}
+    scorer = FakeScorer([emma, dune])
+    use_scorer(scorer)
+
+    asyncio.run(
+        factory.calculate_batch_scores_with_fallback([{"title": "Emma"}], LIBRARY)
+    )
+    results = asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "Emma"}, {"title": "Dune"}], LIBRARY
+        )
+    )
+
+    assert scorer.calls == [[{"title": "Emma"}], [{"title": "Dune"}]]
+    assert results == [emma, dune]
+
+
+def test_batch_scores_are_recomputed_when_the_library_changes(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    scorer = FakeScorer([{"title": "Emma", "score": 0.4, "explanation": "emma"}])
+    use_scorer(scorer)
+
+    asyncio.run(
+        factory.calculate_batch_scores_with_fallback([{"title": "Emma"}], LIBRARY)
+    )
+    asyncio.run(
+        factory.calculate_batch_scores_with_fallback(
+            [{"title": "Emma"}], [*LIBRARY, {"title": "Persuasion"}]
+        )
+    )
+
+    assert len(scorer.calls) == 2
+
+
+def test_concurrent_batch_scores_join_in_flight_books(
+    use_scorer: Callable[[FakeScorer], None],
+) -> None:
+    scorer = FakeScorer([{"title": "Emma", "score": 0.4, "explanation": "emma"}])
+    use_scorer(scorer)
+
+    async def scan_twice() -> list[list[dict | None]]:
+        scorer.release.clear()
+        first = asyncio.create_task(
+            factory.calculate_batch_scores_with_fallback([{"title": "Emma"}], LIBRARY)
+        )
+        await asyncio.sleep(0)
+        second = asyncio.create_task(
+            factory.calculate_batch_scores_with_fallback([{"title": "EMMA"}], LIBRARY)
+        )
+        await asyncio.sleep(0)
+        scorer.release.set()
+        return list(await asyncio.gather(first, second))
+
+    first, second = asyncio.run(scan_twice())
+
+    assert len(scorer.calls) == 1
+    assert first == [{"title": "Emma", "score": 0.4, "explanation": "emma"}]
+    assert second == [{"title": "EMMA", "score": 0.4, "explanation": "emma"}]
+
+
+class FakeProvider:
+    """Provider stand-in whose answer takes a while, or fails."""
+
+    def __init__(self, answer: str, delay: float = 0.0, fail: bool = False) -> None:
+        self.answer = answer
+        self.delay = delay
+        self.fail = fail
+        self.cancelled = False
+
+    async def respond(self) -> str:
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.answer} failed")
+        return self.answer
+
+
+TIMEOUTS = {"openai": 5.0, "anthropic": 5.0, "google": 5.0}
+
+
+def run_with_fallback(
+    monkeypatch: pytest.MonkeyPatch,
+    providers: dict[str, FakeProvider],
+    timeouts: dict[str, float] = TIMEOUTS,
+) -> str:
+    monkeypatch.setattr(factory, "_get_provider", providers.__getitem__)
+    monkeypatch.setattr(
+        factory, "_provider_stats", {name: ProviderStats() for name in TIMEOUTS}
+    )
+
+    async def attempt(provider: FakeProvider) -> str:
+        return await provider.respond()
+
+    return asyncio.run(
+        factory._run_with_fallback(tuple(providers), attempt, "test call", timeouts)
+    )
+
+
+def test_run_with_fallback_tries_next_provider_on_failure(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 0)
+    providers = {
+        "google": FakeProvider("google", fail=True),
+        "openai": FakeProvider("openai"),
+    }
+
+    assert run_with_fallback(monkeypatch, providers) == "openai"
+    assert factory._provider_stats["google"].success_rate < 1.0
+
+
+def test_run_with_fallback_raises_when_all_providers_fail(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 0)
+    providers = {
+        "google": FakeProvider("google", fail=True),
+        "openai": FakeProvider("openai", fail=True),
+    }
+
+    with pytest.raises(RuntimeError, match="google failed"):
+        run_with_fallback(monkeypatch, providers)
+
+
+def test_run_with_fallback_times_out_a_hanging_provider(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 0)
+    providers = {
+        "google": FakeProvider("google", delay=1.0),
+        "openai": FakeProvider("openai"),
+    }
+
+    answer = run_with_fallback(monkeypatch, providers, {**TIMEOUTS, "google": 0.01})
+
+    assert answer == "openai"
+    assert providers["google"].cancelled
+
+
+def test_hedged_run_with_fallback_takes_first_answer(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 10)
+    providers = {
+        "google": FakeProvider("google", delay=1.0),
+        "openai": FakeProvider("openai"),
+    }
+
+    assert run_with_fallback(monkeypatch, providers) == "openai"
+    assert providers["google"].cancelled
+
+
+def test_hedged_run_with_fallback_keeps_a_fast_primary(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 500)
+    providers = {
+        "google": FakeProvider("google"),
+        "openai": FakeProvider("openai"),
+    }
+
+    assert run_with_fallback(monkeypatch, providers) == "google"
+
+
+@pytest.fixture
+def extractions(monkeypatch: pytest.MonkeyPatch) -> list[bytes]:
+    """Record extraction calls, answering with the image bytes as the response.
+
+    Empty images are rejected by every provider; b"timeout" times out on all.
+    """
+    calls: list[bytes] = []
+
+    async def extract(image_bytes: bytes) -> str:
+        calls.append(image_bytes)
+        await asyncio.sleep(0)
+        if not image_bytes:
+            raise ValueError("Every VLM provider rejected the image")
+        if image_bytes == b"timeout":
+            raise RuntimeError("All VLM extraction providers failed")
+        return image_bytes.decode()
+
+    monkeypatch.setattr(factory, "_extraction_cache", {})
+    monkeypatch.setattr(factory, "_failed_extractions", {})
+    monkeypatch.setattr(factory, "_inflight_extractions", {})
+    monkeypatch.setattr(factory, "_extract_titles", extract)
+    return calls
+
+
+def test_concurrent_extractions_of_an_image_share_one_call(
+    extractions: list[bytes],
+) -> None:
+    image = b'[{"title": "Emma"}]'
+
+    async def upload_twice() -> list[str]:
+        return list(
+            await asyncio.gather(
+                factory.extract_titles_with_fallback(image),
+                factory.extract_titles_with_fallback(image),
+            )
+        )
+
+    assert asyncio.run(upload_twice()) == [image.decode()] * 2
+    assert asyncio.run(factory.extract_titles_with_fallback(image)) == image.decode()
+    assert len(extractions) == 1
+
+
+def test_recently_failed_extraction_fails_fast(extractions: list[bytes]) -> None:
+    for _ in range(2):
+        with pytest.raises((ValueError, RuntimeError)):
+            asyncio.run(factory.extract_titles_with_fallback(b""))
+
+    assert len(extractions) == 1
+
+
+def test_transient_extraction_failure_is_retried(extractions: list[bytes]) -> None:
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(factory.extract_titles_with_fallback(b"timeout"))
+
+    assert len(extractions) == 2
+
+
+def test_malformed_extraction_is_not_cached(extractions: list[bytes]) -> None:
+    image = b"Sorry, I can't read this shelf."
+
+    asyncio.run(factory.extract_titles_with_fallback(image))
+    asyncio.run(factory.extract_titles_with_fallback(image))
+
+    assert len(extractions) == 2
+
+
+class VisionProvider:
+    """Provider stand-in whose title extraction fails with a given error."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+    async def extract_titles_from_image(self, image_bytes: bytes) -> str:
+        raise RuntimeError("Vision API error") from self.error
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+def extract_with(
+    monkeypatch: pytest.MonkeyPatch, providers: dict[str, VisionProvider]
+) -> None:
+    async def ordered() -> tuple[str, ...]:
+        return tuple(providers)
+
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 0)
+    monkeypatch.setattr(factory, "_ordered_providers", ordered)
+    monkeypatch.setattr(factory, "_get_provider", providers.__getitem__)
+    monkeypatch.setattr(
+        factory, "_provider_stats", {name: ProviderStats() for name in TIMEOUTS}
+    )
+    asyncio.run(factory._extract_titles(b"image"))
+
+
+def test_extraction_rejected_by_every_provider_raises_value_error(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    providers = {
+        "google": VisionProvider(ValueError("Empty response")),
+        "openai": VisionProvider(ValueError("Empty response")),
+    }
+
+    with pytest.raises(ValueError, match="rejected"):
+        extract_with(monkeypatch, providers)
+
+
+def test_extraction_with_a_transient_failure_is_not_a_rejection(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    providers = {
+        "google": VisionProvider(ValueError("Empty response")),
+        "openai": VisionProvider(ServerError()),
+    }
+
+    with pytest.raises(RuntimeError, match="All VLM extraction providers failed"):
+        extract_with(monkeypatch, providers)
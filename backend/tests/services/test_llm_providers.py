@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any
+
+import httpx
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from app.core.config import settings
+from app.services.llm.providers.google import GEMINI_RETRY, GoogleProvider
+from app.services.llm.providers.openai import (
+    RATE_LIMIT_MAX_PAUSE,
+    OpenAIProvider,
+    parse_reset_duration,
+)
+
+# Same predicate as GEMINI_RETRY, without the real backoff delays
+FAST_GEMINI_RETRY = GEMINI_RETRY.with_delay(initial=0.001, maximum=0.001)
+
+
+@pytest.mark.parametrize(
+    ("value", "seconds"),
+    [("1s", 1.0), ("6m0s", 360.0), ("1h2m3.5s", 3723.5), ("250ms", 0.25), ("", 0.0)],
+)
+def test_parse_reset_duration(value: str, seconds: float) -> None:
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def test_openai_pauses_scoring_when_rate_limit_is_nearly_used_up(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    provider = OpenAIProvider()
+    assert provider.rate_limit_pause() <= 0
+
+    provider._track_rate_limit(
+        httpx.Headers(
+            {
+                "x-ratelimit-remaining-requests": "1",
+                "x-ratelimit-reset-requests": "2s",
+            }
+        )
+    )
+    assert 0 < provider.rate_limit_pause() <= 2.0
+
+    provider._track_rate_limit(
+        httpx.Headers(
+            {
+                "x-ratelimit-remaining-tokens": "10",
+                "x-ratelimit-reset-tokens": "1m",
+            }
+        )
+    )
+    assert provider.rate_limit_pause() <= RATE_LIMIT_MAX_PAUSE
+
+
+def test_openai_ignores_healthy_or_malformed_rate_limit_headers(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", None)
+    provider = OpenAIProvider()
+
+    provider._track_rate_limit(
+        httpx.Headers(
+            {
+                "x-ratelimit-remaining-requests": "500",
+                "x-ratelimit-remaining-tokens": "many",
+            }
+        )
+    )
+
+    assert provider.rate_limit_pause() <= 0
+
+
+class Flaky:
+    """Call raising the given errors in turn, then succeeding."""
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_gemini_retry_retries_transient_errors() -> None:
+    call = Flaky(
+        google_exceptions.ResourceExhausted("quota"),
+        google_exceptions.ServiceUnavailable("overloaded"),
+    )
+
+    assert asyncio.run(FAST_GEMINI_RETRY(call)()) == "ok"
+    assert call.calls == 3
+
+
+def test_gemini_retry_does_not_retry_bad_requests() -> None:
+    call = Flaky(google_exceptions.InvalidArgument("bad image"))
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        asyncio.run(FAST_GEMINI_RETRY(call)())
+    assert call.calls == 1
+
+
+def test_gemini_scoring_passes_retry_policy(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "GOOGLE_API_KEY", None)
+    provider = GoogleProvider()
+    seen_options: list[dict[str, Any]] = []
+
+    class Response:
+        text = '[{"title": "Emma", "score": 0.5, "explanation": "Austen"}]'
+
+    class Model:
+        async def generate_content_async(
+            self, contents: Any, request_options: dict[str, Any]
+        ) -> Response:
+            seen_options.append(request_options)
+            return Response()
+
+    provider.batch_model = Model()
+
+    results = asyncio.run(
+        provider.calculate_batch_match_scores([{"title": "Emma"}], [])
+    )
+
+    assert results[0]["title"] == "Emma"
+    assert seen_options == [{"retry": GEMINI_RETRY}]
@@ -0,0 +1,12 @@
+from app.services.text import normalize_text
+
+
+def test_normalize_text_ignores_case_accents_and_punctuation() -> None:
+    assert normalize_text("Les Misérables ") == normalize_text("les  miserables.")
+    assert normalize_text("The Lord of the Rings: The Two Towers") == (
+        "the lord of the rings the two towers"
+    )
+
+
+def test_normalize_text_keeps_non_latin_scripts() -> None:
+    assert normalize_text("三体") == "三体"